@@ -1,12 +1,18 @@
 # Generated with github copilot
+import functools
 import math
 import sys
-from typing import Iterable, List, Tuple
+from array import array
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Sequence, Tuple
 from xml.etree import ElementTree as et
 
 from kk_plap_generator.generator.utils import keyframe_get
 
 MAX_POSSIBLE_FLOAT: float = sys.float_info.max
+CURVE_NUM_POINTS: int = 200
+
+CurveKeyframe = Tuple[float, float, float, float]
 
 
 def convert_tangent_to_slope(tangent):
@@ -23,11 +29,28 @@ def cubic_hermite_spline(t, p0, p1, m0, m1):
     return h00 * p0 + h10 * m0 + h01 * p1 + h11 * m1
 
 
+@functools.lru_cache(maxsize=8)
+def hermite_basis(
+    num_points: int,
+) -> Tuple[Tuple[float, ...], Tuple[Tuple[float, float, float, float], ...]]:
+    """
+    Sample parameters ``j / num_points`` and the rows (h00, h10, h01, h11) of the cubic
+    Hermite basis matrix at each of them, computed once per resolution.
+    """
+    ts = tuple(j / num_points for j in range(num_points))
+    rows = []
+    for t in ts:
+        t2 = t * t
+        t3 = t2 * t
+        rows.append((2 * t3 - 3 * t2 + 1, t3 - 2 * t2 + t, -2 * t3 + 3 * t2, t3 - t2))
+
+    return ts, tuple(rows)
+
+
 def evaluate_curve_keyframes(
-    curve_keyframes: List[Tuple[float, float, float, float]], num_points: int = 200
-) -> Tuple[List[float], List[float]]:
-    times = [kf[0] for kf in curve_keyframes]
-    values = [kf[1] for kf in curve_keyframes]
+    curve_keyframes: Sequence[CurveKeyframe],
+    num_points: int = CURVE_NUM_POINTS,
+) -> Tuple[array, array]:
     try:
         in_tangents = []
         for kf in curve_keyframes:
@@ -42,45 +65,334 @@ def evaluate_curve_keyframes(
     except ValueError as e:
         raise ValueError(f"convert_tangent_to_slope failed with message {e}: {kf}")
 
-    evaluated_times = []
-    evaluated_values = []
+    evaluated_times = array("d")
+    evaluated_values = array("d")
+    if len(curve_keyframes) < 2:
+        return evaluated_times, evaluated_values
 
-    try:
-        for i in range(len(times) - 1):
-            t0, t1 = times[i], times[i + 1]
-            p0, p1 = values[i], values[i + 1]
-            m0, m1 = out_tangents[i], in_tangents[i + 1]
-
-            for j in range(num_points):
-                t = j / num_points
-                time = t0 + t * (t1 - t0)
-                value = cubic_hermite_spline(t, p0, p1, m0, m1)
-                evaluated_times.append(time)
-                evaluated_values.append(value)
-    except IndexError:
-        raise IndexError(f"{times} {values} {in_tangents} {out_tangents}")
+    ts, basis = hermite_basis(num_points)
+    for i in range(len(curve_keyframes) - 1):
+        t0, p0 = curve_keyframes[i][0], curve_keyframes[i][1]
+        t1, p1 = curve_keyframes[i + 1][0], curve_keyframes[i + 1][1]
+        m0, m1 = out_tangents[i], in_tangents[i + 1]
+        span = t1 - t0
+
+        evaluated_times.extend([t0 + t * span for t in ts])
+        evaluated_values.extend(
+            [a * p0 + b * m0 + c * p1 + d * m1 for a, b, c, d in basis]
+        )
 
     return evaluated_times, evaluated_values
 
 
+CubicCoefficients = Tuple[float, float, float, float]
+
+# Precision of the crossing parameters found by bisection
+CROSSING_TOLERANCE: float = 1e-9
+
+
+@functools.lru_cache(maxsize=256)
+def hermite_segments(
+    curve_keyframes: Tuple[CurveKeyframe, ...],
+) -> Tuple[Tuple[float, float, CubicCoefficients], ...]:
+    """
+    Start time, end time and power basis coefficients (a, b, c, d) of each segment of
+    a curve, its value at ``u`` in [0, 1] being ``a*u**3 + b*u**2 + c*u + d``. Same
+    curve as ``evaluate_curve_keyframes`` samples.
+    """
+    segments = []
+    for kf0, kf1 in zip(curve_keyframes, curve_keyframes[1:]):
+        p0, p1 = kf0[1], kf1[1]
+        m0, m1 = convert_tangent_to_slope(kf0[3]), convert_tangent_to_slope(kf1[2])
+        coefficients = (
+            2 * p0 + m0 - 2 * p1 + m1,
+            -3 * p0 - 2 * m0 + 3 * p1 - m1,
+            m0,
+            p0,
+        )
+        segments.append((kf0[0], kf1[0], coefficients))
+
+    return tuple(segments)
+
+
+# Shapes of curves, see ``classify_curve``
+CURVE_EMPTY = 0
+CURVE_CONSTANT = 1
+CURVE_LINEAR = 2
+CURVE_GENERAL = 3
+
+# Coefficients of a curve smaller than this are zero when classifying it, curve
+# attributes are rounded to 5 digits so lines are rarely exact
+SHAPE_TOLERANCE: float = 1e-6
+# Largest spread of the samples of a flat segment, float noise only
+FLAT_TOLERANCE: float = 1e-12
+
+
+@functools.lru_cache(maxsize=256)
+def classify_curve(
+    curve_keyframes: Tuple[CurveKeyframe, ...], num_points: int = CURVE_NUM_POINTS
+) -> int:
+    """
+    Shape of a curve: ``CURVE_EMPTY`` without segment, ``CURVE_CONSTANT`` when every
+    segment is flat (step curves), ``CURVE_LINEAR`` when every segment is a line and
+    ``CURVE_GENERAL`` otherwise.
+
+    The samples of the curve are checked too, within ``FLAT_TOLERANCE`` of each other
+    for each flat segment and monotonic for each line, so that the fast paths give
+    the same results as the samples.
+    """
+    segments = hermite_segments(curve_keyframes)
+    if not segments:
+        return CURVE_EMPTY
+    if any(
+        abs(a) > SHAPE_TOLERANCE or abs(b) > SHAPE_TOLERANCE
+        for _, _, (a, b, _, _) in segments
+    ):
+        return CURVE_GENERAL
+
+    _, values = evaluate_curve_cached(curve_keyframes, num_points)
+    pieces = [values[k * num_points : (k + 1) * num_points] for k in range(len(segments))]
+    if all(
+        abs(c) <= SHAPE_TOLERANCE and max(piece) - min(piece) <= FLAT_TOLERANCE
+        for (_, _, (_, _, c, _)), piece in zip(segments, pieces)
+    ):
+        return CURVE_CONSTANT
+    if all(
+        all(x <= y for x, y in zip(piece, piece[1:]))
+        or all(x >= y for x, y in zip(piece, piece[1:]))
+        for piece in pieces
+    ):
+        return CURVE_LINEAR
+
+    return CURVE_GENERAL
+
+
+# Margin of the bounds of a curve, covers the rounding errors of its samples
+BOUNDS_MARGIN: float = 1e-9
+
+
+@functools.lru_cache(maxsize=256)
+def hermite_bounds(curve_keyframes: Tuple[CurveKeyframe, ...]) -> Tuple[float, float]:
+    """
+    Lower and upper bounds of the values of a curve, from the endpoints and tangents
+    of its segments: the extrema of a segment are at its ends or where its derivative
+    ``3a*u**2 + 2b*u + c`` is zero.
+    """
+    values = [
+        evaluate_cubic(coefficients, u)
+        for _, _, coefficients in hermite_segments(curve_keyframes)
+        for u in (0.0, *cubic_extrema(coefficients), 1.0)
+    ]
+    if not values:
+        return 0.0, 0.0
+
+    return min(values) - BOUNDS_MARGIN, max(values) + BOUNDS_MARGIN
+
+
+@functools.lru_cache(maxsize=256)
+def sampled_bounds(
+    curve_keyframes: Tuple[CurveKeyframe, ...], num_points: int = CURVE_NUM_POINTS
+) -> Optional[Tuple[float, float]]:
+    """Lowest and highest sampled values of a curve, None if it has no samples."""
+    _, values = evaluate_curve_cached(curve_keyframes, num_points)
+    if not len(values):
+        return None
+
+    return min(values), max(values)
+
+
+def evaluate_cubic(coefficients: CubicCoefficients, u: float) -> float:
+    a, b, c, d = coefficients
+    return ((a * u + b) * u + c) * u + d
+
+
+def evaluate_curve_at(curve_keyframes: Tuple[CurveKeyframe, ...], u: float) -> float:
+    """Value of a curve at curve time ``u``, ``u`` itself without segment (linear)."""
+    segments = hermite_segments(curve_keyframes)
+    if not segments:
+        return u
+
+    for start, end, coefficients in segments:
+        if u < end:
+            break
+    span = end - start
+    return evaluate_cubic(
+        coefficients, min(max((u - start) / span, 0.0), 1.0) if span > 0 else 0.0
+    )
+
+
+def cubic_extrema(coefficients: CubicCoefficients) -> List[float]:
+    """Parameters in (0, 1) of the local extrema of a cubic, sorted."""
+    a, b, c, _ = coefficients
+    # Roots of the derivative 3a*u**2 + 2b*u + c
+    if a != 0.0:
+        discriminant = b * b - 3 * a * c
+        if discriminant <= 0.0:
+            return []
+        root = math.sqrt(discriminant)
+        extrema = [(-b - root) / (3 * a), (-b + root) / (3 * a)]
+    elif b != 0.0:
+        extrema = [-c / (2 * b)]
+    else:
+        return []
+
+    return sorted(u for u in extrema if 0.0 < u < 1.0)
+
+
+def solve_cubic(coefficients: CubicCoefficients, target: float) -> List[float]:
+    """
+    Parameters in [0, 1) at which the cubic crosses or touches ``target``, sorted.
+
+    The interval is split at the extrema of the cubic, each monotonic piece holds at
+    most one crossing which is found by bisection.
+    """
+    bounds = [0.0, *cubic_extrema(coefficients), 1.0]
+
+    roots: List[float] = []
+    for low, high in zip(bounds, bounds[1:]):
+        f_low = evaluate_cubic(coefficients, low) - target
+        f_high = evaluate_cubic(coefficients, high) - target
+        if f_low == 0.0:
+            if not roots or roots[-1] != low:
+                roots.append(low)
+            continue
+        if f_high == 0.0 or (f_low < 0.0) == (f_high < 0.0):
+            # A crossing at ``high`` is the start of the next piece
+            continue
+
+        while high - low > CROSSING_TOLERANCE:
+            middle = (low + high) / 2
+            f_middle = evaluate_cubic(coefficients, middle) - target
+            if f_middle == 0.0:
+                low = high = middle
+            elif (f_middle < 0.0) == (f_low < 0.0):
+                low, f_low = middle, f_middle
+            else:
+                high = middle
+        roots.append(high)
+
+    return roots
+
+
+def find_crossings(
+    curve_keyframes: Sequence[CurveKeyframe], targets: Iterable[float]
+) -> List[Tuple[float, float]]:
+    """
+    Curve times of the crossings of the curve with any of the target values, with the
+    curve value in the middle of the interval that starts at each of them. The start
+    of every curve segment is included, crossings are exact instead of sampled.
+    """
+    targets = list(targets)
+    crossings: List[Tuple[float, float]] = []
+    for start, end, coefficients in hermite_segments(tuple(curve_keyframes)):
+        span = end - start
+        params = sorted(
+            {0.0, *(u for t in targets for u in solve_cubic(coefficients, t))}
+        )
+        for u, next_u in zip(params, [*params[1:], 1.0]):
+            crossings.append(
+                (start + u * span, evaluate_cubic(coefficients, (u + next_u) / 2))
+            )
+
+    return crossings
+
+
+def clean_curve_keyframe(curve_keyframe: et.Element) -> CurveKeyframe:
+    time = keyframe_get(curve_keyframe, "time")
+    if time == math.inf:
+        time = MAX_POSSIBLE_FLOAT
+    value = keyframe_get(curve_keyframe, "value")
+    if value == math.inf:
+        value = MAX_POSSIBLE_FLOAT
+    in_tangent = keyframe_get(curve_keyframe, "inTangent")
+    if in_tangent == math.inf:
+        in_tangent = MAX_POSSIBLE_FLOAT
+    out_tangent = keyframe_get(curve_keyframe, "outTangent")
+    if out_tangent == math.inf:
+        out_tangent = MAX_POSSIBLE_FLOAT
+
+    return time, value, in_tangent, out_tangent
+
+
 def evaluate_curve(
     curve_keyframes: Iterable[et.Element],
 ) -> Tuple[List[float], List[float]]:
-    cleaned_curve_keyframes = []
-    for ckf in curve_keyframes:
-        value = keyframe_get(ckf, "value")
-        if value == math.inf:
-            value = MAX_POSSIBLE_FLOAT
-        time = keyframe_get(ckf, "time")
-        if time == math.inf:
-            time = MAX_POSSIBLE_FLOAT
-        in_tangent = keyframe_get(ckf, "inTangent")
-        if in_tangent == math.inf:
-            in_tangent = MAX_POSSIBLE_FLOAT
-        out_tangent = keyframe_get(ckf, "outTangent")
-        if out_tangent == math.inf:
-            out_tangent = MAX_POSSIBLE_FLOAT
-
-        cleaned_curve_keyframes.append((time, value, in_tangent, out_tangent))
-
-    return evaluate_curve_keyframes(cleaned_curve_keyframes)
+    evaluated_times, evaluated_values = evaluate_curve_keyframes(
+        [clean_curve_keyframe(ckf) for ckf in curve_keyframes]
+    )
+    return list(evaluated_times), list(evaluated_values)
+
+
+class CurveCache:
+    """
+    Bounded LRU cache of evaluated curves, keyed by the cleaned
+    (time, value, inTangent, outTangent) tuples of the curve keyframes.
+
+    Scenes reuse a handful of curve shapes for thousands of keyframes, the evaluated
+    samples are shared between them as read-only memoryviews.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[
+            Tuple[Tuple[CurveKeyframe, ...], int], Tuple[memoryview, memoryview]
+        ] = OrderedDict()
+
+    def get(
+        self,
+        curve_keyframes: Sequence[CurveKeyframe],
+        num_points: int = CURVE_NUM_POINTS,
+    ) -> Tuple[memoryview, memoryview]:
+        key = (tuple(curve_keyframes), num_points)
+        samples = self._data.get(key)
+        if samples is None:
+            self.misses += 1
+            samples = self._store(key)
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+
+        return samples
+
+    def prewarm(self, root: et.Element, num_points: int = CURVE_NUM_POINTS) -> None:
+        """Evaluate the curves of every keyframe under ``root`` (ex. template.xml)."""
+        for keyframe in root.iter("keyframe"):
+            key = (tuple(clean_curve_keyframe(ckf) for ckf in keyframe), num_points)
+            if key not in self._data:
+                self._store(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self):
+        return f"CurveCache(size={len(self)}/{self.maxsize}, hits={self.hits}, misses={self.misses})"
+
+    def _store(
+        self, key: Tuple[Tuple[CurveKeyframe, ...], int]
+    ) -> Tuple[memoryview, memoryview]:
+        evaluated_times, evaluated_values = evaluate_curve_keyframes(*key)
+        samples = (
+            memoryview(evaluated_times).toreadonly(),
+            memoryview(evaluated_values).toreadonly(),
+        )
+        self._data[key] = samples
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+        return samples
+
+
+CURVE_CACHE = CurveCache()
+
+
+def evaluate_curve_cached(
+    curve_keyframes: Sequence[CurveKeyframe], num_points: int = CURVE_NUM_POINTS
+) -> Tuple[memoryview, memoryview]:
+    return CURVE_CACHE.get(curve_keyframes, num_points)
@@ -0,0 +1,283 @@
+import bisect
+import itertools
+from typing import List, Optional, Sequence, Tuple
+
+from kk_plap_generator.generator.curve_ops import CurveKeyframe, evaluate_curve_at
+from kk_plap_generator.generator.models import EventTable
+from kk_plap_generator.generator.plap_detector import (
+    HOLD,
+    PULL_OUT,
+    PUSH_IN,
+    TOGGLE,
+    PlapDetector,
+)
+from kk_plap_generator.generator.utils import END_TICKS, to_ticks
+
+# Kinds of activable events
+EVENT_MUTE = 0
+EVENT_ON = 1
+EVENT_CUTOFF = 2
+
+# Time (in ticks) an activable item is muted before each of its plaps, the largest
+# frame tick the compaction accepts
+MUTE_LEAD: int = to_ticks(0.05)
+
+# Points checked between two keyframes when decimating keyframes with curves
+DECIMATION_SAMPLES = 8
+
+# Value of the activable keyframe of each kind of event
+EVENT_VALUES = ("false", "true", "false")
+
+# Preg+ curve (out curve when True) of a keyframe for each plap detector flag,
+# indexed by the curve of the previous keyframe
+_PREG_PLUS_TRANSITIONS = {
+    HOLD: (True, False),
+    PUSH_IN: (True, True),
+    PULL_OUT: (False, False),
+    TOGGLE: (False, True),
+}
+
+
+def assign_items(count: int, sequence: Sequence[int]) -> List[int]:
+    """Item of each of the ``count`` plaps, going round the pattern sequence."""
+    if not sequence:
+        return []
+
+    length = len(sequence)
+    return [sequence[i % length] for i in range(count)]
+
+
+def make_activable_events(
+    plap_times: Sequence[int],
+    items: Sequence[int],
+    offset: int,
+    item_offsets: Sequence[int],
+    item_cutoffs: Sequence[int],
+    min_gap: int,
+    mute_lead: int,
+) -> EventTable:
+    """
+    Events of each item for the plaps: a mute ``mute_lead`` before the plap, the plap
+    and, with a positive cutoff, a cutoff after it. Times are in ticks.
+
+    Events of an item less than ``min_gap`` before one of its plaps are dropped.
+    """
+    starts = [time + offset + item_offsets[item] for time, item in zip(plap_times, items)]
+
+    # (time, kind) of the kept events of each item
+    stacks: List[List[Tuple[int, int]]] = [[] for _ in item_offsets]
+    for start, item in zip(starts, items):
+        stack = stacks[item]
+        limit = start - min_gap
+        while stack and stack[-1][0] >= limit:
+            stack.pop()
+
+        stack.append((start - mute_lead, EVENT_MUTE))
+        stack.append((start, EVENT_ON))
+        cutoff = item_cutoffs[item]
+        if cutoff > 0:
+            stack.append((start + cutoff, EVENT_CUTOFF))
+
+    events = EventTable()
+    for stack in stacks:
+        events.append_item([e[0] for e in stack], [e[1] for e in stack])
+
+    return events
+
+
+def compact_events(events: EventTable, frame_tick: int = 0) -> EventTable:
+    """
+    Events without the keyframes that keep the on/off state of their item, like a
+    mute right after a cutoff. With a ``frame_tick`` (in ticks, up to
+    ``MUTE_LEAD``), times are first snapped to its nearest multiples.
+
+    Events never share a tick, the later one wins. So that a plap still shows, a
+    mute snapped onto its tick moves one tick earlier when that tick is free, and a
+    cutoff snapped onto its tick moves one tick later. No event moves by more than
+    one tick from its snapped time.
+    """
+    if frame_tick > MUTE_LEAD:
+        raise ValueError(
+            f"Frame tick of {frame_tick} ticks is longer than the mute lead ({MUTE_LEAD})"
+        )
+
+    compacted = EventTable()
+    for item in range(events.items_count):
+        rows = events.segment(item)
+        times = [events.time[row] for row in rows]
+        kinds = [events.kind[row] for row in rows]
+        if frame_tick > 0:
+            half_tick = frame_tick // 2
+            snapped: List[Tuple[int, int]] = []
+            for time, kind in zip(times, kinds):
+                time = (time + half_tick) // frame_tick * frame_tick
+                if snapped and snapped[-1][0] == time:
+                    if snapped[-1][1] == EVENT_ON and kind == EVENT_CUTOFF:
+                        time += frame_tick
+                    elif (
+                        snapped[-1][1] == EVENT_MUTE
+                        and kind == EVENT_ON
+                        and (len(snapped) < 2 or snapped[-2][0] < time - frame_tick)
+                    ):
+                        snapped[-1] = (time - frame_tick, EVENT_MUTE)
+                while snapped and snapped[-1][0] >= time:
+                    snapped.pop()
+                snapped.append((time, kind))
+            times = [event[0] for event in snapped]
+            kinds = [event[1] for event in snapped]
+
+        values = [EVENT_VALUES[kind] for kind in kinds]
+        kept = [i for i, value in enumerate(values) if i == 0 or value != values[i - 1]]
+        compacted.append_item([times[i] for i in kept], [kinds[i] for i in kept])
+
+    return compacted
+
+
+def make_preg_plus_events(
+    times: Sequence[int],
+    values: Sequence[float],
+    detector: PlapDetector,
+    offset: int,
+    min_value: int,
+    max_value: int,
+    min_gap: int,
+    round_digits: int = 5,
+) -> Tuple[List[int], List[int], List[int], List[bool]]:
+    """
+    Preg+ keyframes of a section of time sorted keyframes: the index of the kept
+    keyframes with their time, Preg+ value and whether they start a pull out (out
+    curve) or a push in (in curve). Times are in ticks.
+
+    The value goes from ``max_value`` at the reference to ``min_value`` at the
+    estimated pull out distance. Keyframes less than ``min_gap`` before the next one
+    are dropped.
+    """
+    reference = detector.reference
+    ref_value, out_direction = reference.value, reference.out_direction
+    ref_position = ref_value * out_direction
+    estimated_pull_out = reference.estimated_pull_out
+    distances = [
+        0.0
+        if value * out_direction <= ref_position
+        else round(abs(ref_value - value), round_digits)
+        for value in values
+    ]
+    preg_values = [
+        min_value
+        if distance > estimated_pull_out
+        else max(
+            int(max(estimated_pull_out - distance, 0.0) / estimated_pull_out * max_value),
+            min_value,
+        )
+        for distance in distances
+    ]
+
+    # Curve of each keyframe, the state flips after every keyframe unless a keyframe
+    # sets it: too far or pulled out uses the in curve, pushed in the out curve.
+    transitions = [
+        PULL_OUT if distance > estimated_pull_out else flag
+        for distance, flag in zip(distances, detector.classify(values))
+    ]
+    is_plaps = list(
+        itertools.accumulate(
+            transitions,
+            lambda is_plap, flag: _PREG_PLUS_TRANSITIONS[flag][is_plap],
+            initial=True,
+        )
+    )[1:]
+
+    time_actuals = [time + offset for time in times]
+    kept = [
+        i
+        for i, (time, next_time) in enumerate(
+            zip(time_actuals, [*time_actuals[1:], END_TICKS])
+        )
+        if time < next_time - min_gap
+    ]
+    return (
+        kept,
+        [time_actuals[i] for i in kept],
+        [preg_values[i] for i in kept],
+        [is_plaps[i] for i in kept],
+    )
+
+
+def decimate_keyframes(
+    times: Sequence[float],
+    values: Sequence[float],
+    tolerance: float,
+    curves: Optional[Sequence[Tuple[CurveKeyframe, ...]]] = None,
+) -> List[int]:
+    """
+    Indexes of the keyframes kept by a Ramer-Douglas-Peucker pass in (time, value)
+    space: the value displayed with the kept keyframes stays within ``tolerance`` of
+    the value displayed with all of them. Runs of identical values only keep their
+    first and last keyframes.
+
+    The value between two keyframes follows the curve of the first one in
+    ``curves``, linear without curves. With curves, the error is measured at the
+    keyframes and at ``DECIMATION_SAMPLES`` points between each pair of them.
+    """
+    count = len(values)
+    if count <= 2:
+        return list(range(count))
+
+    def shape(i: int, u: float) -> float:
+        return u if curves is None else evaluate_curve_at(curves[i], u)
+
+    # The displayed values with every keyframe, keyframe i is point i * samples
+    samples = 1 if curves is None else DECIMATION_SAMPLES
+    point_times: List[float] = []
+    point_values: List[float] = []
+    for i in range(count - 1):
+        span, diff = times[i + 1] - times[i], values[i + 1] - values[i]
+        for k in range(samples):
+            u = k / samples
+            point_times.append(times[i] + span * u)
+            point_values.append(values[i] + diff * shape(i, u))
+    point_times.append(times[-1])
+    point_values.append(values[-1])
+
+    candidates = (
+        [0]
+        + [
+            i
+            for i in range(1, count - 1)
+            if not values[i - 1] == values[i] == values[i + 1]
+        ]
+        + [count - 1]
+    )
+
+    keep = [False] * len(candidates)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(candidates) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        start, end = candidates[first], candidates[last]
+        start_time, start_value = times[start], values[start]
+        span, diff = times[end] - start_time, values[end] - start_value
+        error, point = max(
+            (
+                abs(
+                    point_values[p]
+                    - start_value
+                    - diff * shape(start, (point_times[p] - start_time) / span)
+                ),
+                p,
+            )
+            for p in range(start * samples + 1, end * samples)
+        )
+        if error > tolerance:
+            # Split at the candidate closest to the worst point
+            position = point / samples
+            split = bisect.bisect_left(candidates, position, first + 1, last - 1)
+            if position - candidates[split - 1] < candidates[split] - position:
+                split = max(split - 1, first + 1)
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return [i for i, kept in zip(candidates, keep) if kept]
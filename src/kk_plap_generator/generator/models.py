@@ -1,55 +1,316 @@
-from typing import Iterator, Optional, Sequence, Union, cast
+import heapq
+from array import array
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple, Union
 from xml.etree import ElementTree as et
 
-from kk_plap_generator.generator.utils import keyframe_get
+from kk_plap_generator.generator.curve_ops import (
+    CurveKeyframe,
+    classify_curve,
+    clean_curve_keyframe,
+)
+from kk_plap_generator.generator.utils import (
+    END_TICKS,
+    format_value,
+    keyframe_get,
+    keyframe_ticks,
+    to_ticks,
+)
 
+# Position axes, indexed by ``KeyframeReference.axis_index``
+AXES = ("valueX", "valueY", "valueZ")
 
-class PositionKeyframe:
-    node: et.Element
 
-    def __init__(self, node: et.Element):
-        self.node = node
+class KeyframeTable:
+    """
+    Columnar copy of the keyframes of an interpolable, every attribute is parsed once.
+    Times are integer ticks (``utils.TICKS_PER_SECOND``).
 
-    def get_axis_value(self, axis: str) -> float:
-        return keyframe_get(self.node, axis)
+    The curve keyframes of row ``i`` are stored in the ``curve_*`` columns between
+    ``curve_offsets[i]`` and ``curve_offsets[i + 1]``, the shape of the curve
+    (``curve_ops.classify_curve``) in ``curve_kind[i]``.
+    """
 
-    @property
-    def time(self) -> float:
-        return keyframe_get(self.node, "time")
+    AXES = AXES
+
+    nodes: List[et.Element]
+    time: array
+    valueX: array
+    valueY: array
+    valueZ: array
+    curve_offsets: array
+    curve_time: array
+    curve_value: array
+    curve_in_tangent: array
+    curve_out_tangent: array
+    curve_kind: array
+
+    def __init__(self):
+        self.nodes = []
+        self.time = array("q")
+        self.valueX = array("d")
+        self.valueY = array("d")
+        self.valueZ = array("d")
+        self.curve_offsets = array("q", [0])
+        self.curve_time = array("d")
+        self.curve_value = array("d")
+        self.curve_in_tangent = array("d")
+        self.curve_out_tangent = array("d")
+        self.curve_kind = array("b")
+
+    @classmethod
+    def from_keyframes(cls, keyframes: Iterable[et.Element]) -> "KeyframeTable":
+        table = cls()
+        for keyframe in keyframes:
+            table._append(
+                keyframe,
+                keyframe_ticks(keyframe),
+                keyframe_get(keyframe, "valueX"),
+                keyframe_get(keyframe, "valueY"),
+                keyframe_get(keyframe, "valueZ"),
+                [clean_curve_keyframe(ckf) for ckf in keyframe],
+            )
+
+        return table
+
+    def take(self, indices: Iterable[int]) -> "KeyframeTable":
+        """New table made of the given rows, in order (rows can repeat)."""
+        table = KeyframeTable()
+        for i in indices:
+            table._append(
+                self.nodes[i],
+                self.time[i],
+                self.valueX[i],
+                self.valueY[i],
+                self.valueZ[i],
+                self.curve(i),
+            )
+
+        return table
+
+    def sorted_by_time(self) -> "KeyframeTable":
+        """This table if its rows are already in time order, else a sorted copy."""
+        times = self.time
+        if all(times[i] <= times[i + 1] for i in range(len(times) - 1)):
+            return self
+
+        return self.take(sorted(range(len(times)), key=times.__getitem__))
+
+    def axis(self, axis: Union[str, int]) -> array:
+        """Values of an axis, by name or by index in ``AXES``."""
+        if isinstance(axis, str):
+            if axis not in AXES:
+                raise ValueError(f"Invalid axis: {axis}")
+            axis = AXES.index(axis)
+
+        return (self.valueX, self.valueY, self.valueZ)[axis]
+
+    def curve(self, index: int) -> List[CurveKeyframe]:
+        if index < 0:
+            index += len(self)
+        start, stop = self.curve_offsets[index], self.curve_offsets[index + 1]
+        return list(
+            zip(
+                self.curve_time[start:stop],
+                self.curve_value[start:stop],
+                self.curve_in_tangent[start:stop],
+                self.curve_out_tangent[start:stop],
+            )
+        )
+
+    def _append(
+        self,
+        node: et.Element,
+        time: int,
+        valueX: float,
+        valueY: float,
+        valueZ: float,
+        curve: Sequence[CurveKeyframe],
+    ):
+        self.nodes.append(node)
+        self.time.append(time)
+        self.valueX.append(valueX)
+        self.valueY.append(valueY)
+        self.valueZ.append(valueZ)
+        for c_time, c_value, c_in_tangent, c_out_tangent in curve:
+            self.curve_time.append(c_time)
+            self.curve_value.append(c_value)
+            self.curve_in_tangent.append(c_in_tangent)
+            self.curve_out_tangent.append(c_out_tangent)
+        self.curve_offsets.append(len(self.curve_time))
+        self.curve_kind.append(classify_curve(tuple(curve)))
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+
+class SampledTrajectory:
+    """
+    Keyframes of a section sampled along their curves, built when first needed.
+
+    Segment ``i`` (keyframe ``i`` followed by the samples of its curve toward keyframe
+    ``i + 1``) is stored between ``offsets[i]`` and ``offsets[i + 1]``. The last keyframe
+    only closes the previous segment and is not part of the trajectory. Times are
+    integer ticks.
+    """
+
+    time: array
+    valueX: array
+    valueY: array
+    valueZ: array
+    offsets: array
+
+    def __init__(self):
+        self.time = array("q")
+        self.valueX = array("d")
+        self.valueY = array("d")
+        self.valueZ = array("d")
+        self.offsets = array("q", [0])
+
+    def axis(self, axis: Union[str, int]) -> array:
+        """Values of an axis, by name or by index in ``AXES``."""
+        if isinstance(axis, str):
+            if axis not in AXES:
+                raise ValueError(f"Invalid axis: {axis}")
+            axis = AXES.index(axis)
+
+        return (self.valueX, self.valueY, self.valueZ)[axis]
+
+    def segment(self, index: int) -> range:
+        return range(self.offsets[index], self.offsets[index + 1])
 
     @property
-    def valueX(self) -> float:
-        return keyframe_get(self.node, "valueX")
+    def segments_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+
+class EventTable:
+    """
+    Keyframes to emit for the items of an activable component, as parallel columns
+    of time (in ticks), item index and kind (``EVENT_MUTE``, ``EVENT_ON`` or ``EVENT_CUTOFF``).
+
+    Rows are grouped by item, the events of item ``i`` are stored between
+    ``offsets[i]`` and ``offsets[i + 1]`` in time order.
+    """
+
+    time: array
+    item: array
+    kind: array
+    offsets: array
+
+    def __init__(self):
+        self.time = array("q")
+        self.item = array("q")
+        self.kind = array("b")
+        self.offsets = array("q", [0])
+
+    def append_item(self, times: Iterable[int], kinds: Iterable[int]):
+        """Add the events of the next item."""
+        item = len(self.offsets) - 1
+        self.time.extend(times)
+        self.kind.extend(kinds)
+        self.item.extend([item] * (len(self.time) - len(self.item)))
+        self.offsets.append(len(self.time))
+
+    def segment(self, item: int) -> range:
+        return range(self.offsets[item], self.offsets[item + 1])
 
     @property
-    def valueY(self) -> float:
-        return keyframe_get(self.node, "valueY")
+    def items_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+
+class InterpolableTable:
+    """
+    Generated interpolable, kept as columns until ``xml_writer`` streams it: the
+    ``<interpolable>`` node without keyframes, and for each keyframe its time (in
+    ticks), its formatted value and the index of the template keyframe it copies,
+    attributes and curve keyframes included.
+    """
+
+    node: et.Element
+    templates: List[et.Element]
+    time: array
+    value: List[str]
+    template: array
+
+    def __init__(self, node: et.Element, templates: Iterable[et.Element] = ()):
+        self.node = node
+        self.templates = list(templates)
+        self.time = array("q")
+        self.value = []
+        self.template = array("q")
+
+    def add_template(self, template: et.Element) -> int:
+        """Add a template keyframe, returns its index."""
+        self.templates.append(template)
+        return len(self.templates) - 1
+
+    def append(self, time: int, value: Any, template: int = 0):
+        self.time.append(time)
+        self.value.append(format_value(value))
+        self.template.append(template)
 
     @property
-    def valueZ(self) -> float:
-        return keyframe_get(self.node, "valueZ")
+    def alias(self) -> Optional[str]:
+        return self.node.get("alias")
 
-    def get(self, field_name: str, default=None):
-        return self.node.get(field_name, default)
+    def __len__(self) -> int:
+        return len(self.time)
 
-    def set(self, field_name: str, value):
-        self.node.set(field_name, value)
+    @classmethod
+    def merge(
+        cls, tables: Sequence["InterpolableTable"], min_gap: float
+    ) -> Tuple["InterpolableTable", List[int]]:
+        """
+        K-way merge of interpolables of the same alias, each one a stream of keyframes
+        sorted by time. A keyframe within ``min_gap`` of the last kept keyframe of
+        another interpolable is dropped. Returns the merged interpolable, on the node
+        of the first one, and the count of keyframes kept from each interpolable.
+        """
+        merged = cls(tables[0].node)
+        # Index of the templates of each table in the merged table
+        template_offsets = []
+        for table in tables:
+            template_offsets.append(len(merged.templates))
+            merged.templates.extend(table.templates)
 
-    def __iter__(self) -> Iterator[et.Element]:
-        return iter(list(self.node))
+        # (time, table index, row), the indexes break ties by priority
+        streams = [
+            sorted((time, i, j) for j, time in enumerate(table.time))
+            for i, table in enumerate(tables)
+        ]
+        kept_counts = [0] * len(tables)
+        gap = to_ticks(min_gap)
+        last_time, last_i = -END_TICKS, -1
+        for time, i, j in heapq.merge(*streams):
+            if i != last_i and time <= last_time + gap:
+                continue
+            merged.time.append(time)
+            merged.value.append(tables[i].value[j])
+            merged.template.append(template_offsets[i] + tables[i].template[j])
+            kept_counts[i] += 1
+            last_time, last_i = time, i
+
+        return merged, kept_counts
 
 
 class KeyframeReference:
     value: float
-    time: float
-    axis: str
+    time: int  # Ticks
+    axis_index: int  # In AXES
     out_direction: float
     estimated_pull_out: float
 
     def __init__(
         self,
         value: float,
-        time: float,
+        time: int,
         *,
         axis: str,
         out_direction: float,
@@ -57,89 +318,38 @@ class KeyframeReference:
     ):
         self.value = value
         self.time = time
-        self.axis = axis
+        self.axis_index = AXES.index(axis)
         self.out_direction = out_direction
         self.estimated_pull_out = estimated_pull_out
 
+    @property
+    def axis(self) -> str:
+        return AXES[self.axis_index]
 
-class Section:
-    reference: "KeyframeReference"
-    keyframes: Sequence[et.Element]
-
-    def __init__(self, reference: "KeyframeReference", keyframes: Sequence[et.Element]):
-        self.reference = reference
-        self.keyframes = keyframes
-
-
-class PlapAxis:
-    value: str
-
-    def __init__(self, value: Optional[Union[str, "PlapAxis"]] = None):
-        if isinstance(value, PlapAxis):
-            self.value = value.value
-        else:
-            self.value = cast(str, value) or "to_be_set"
-
-    def __repr__(self):
-        return f"PlapAxis({self.value})"
 
+class Section:
+    """
+    Keyframes of a time range with their reference. The sampled trajectory is only
+    built if asked for, the detection samples the segments it needs by itself.
+    """
 
-class PlapFrame:
-    time: float
-    valueX: float
-    valueY: float
-    valueZ: float
-    axis: PlapAxis
+    reference: "KeyframeReference"
+    keyframes: "KeyframeTable"
 
     def __init__(
-        self, time: float, valueX: float, valueY: float, valueZ: float, axis: PlapAxis
+        self,
+        reference: "KeyframeReference",
+        keyframes: "KeyframeTable",
+        sample: Callable[["KeyframeTable"], "SampledTrajectory"],
     ):
-        self.time = time
-        self.valueX = valueX
-        self.valueY = valueY
-        self.valueZ = valueZ
-        self.axis = axis
+        self.reference = reference
+        self.keyframes = keyframes
+        self._sample = sample
+        self._trajectory: Optional[SampledTrajectory] = None
 
     @property
-    def value(self) -> float:
-        if self.axis.value == "valueX":
-            return self.valueX
-        elif self.axis.value == "valueY":
-            return self.valueY
-        elif self.axis.value == "valueZ":
-            return self.valueZ
-        else:
-            raise ValueError(f"Invalid axis: {self.axis.value}")
-
-    @value.setter
-    def value(self, value: float):
-        if self.axis.value == "valueX":
-            self.valueX = value
-        elif self.axis.value == "valueY":
-            self.valueY = value
-        elif self.axis.value == "valueZ":
-            self.valueZ = value
-        else:
-            raise ValueError(f"Invalid axis: {self.axis.value}")
-
-    def __repr__(self):
-        return f"PlapFrame({self.time}, {self.valueX}, {self.valueY}, {self.valueZ}, {self.axis})"
-
-
-class PlapFrameReference(PlapFrame):
-    out_direction: float
-    estimated_pull_out: float
+    def trajectory(self) -> "SampledTrajectory":
+        if self._trajectory is None:
+            self._trajectory = self._sample(self.keyframes)
 
-    def __init__(
-        self,
-        time: float,
-        valueX: float,
-        valueY: float,
-        valueZ: float,
-        axis: PlapAxis,
-        out_direction: float,
-        estimated_pull_out: float,
-    ):
-        super().__init__(time, valueX, valueY, valueZ, axis)
-        self.out_direction = out_direction
-        self.estimated_pull_out = estimated_pull_out
+        return self._trajectory
@@ -0,0 +1,170 @@
+import functools
+import os
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+
+from kk_plap_generator.generator.plap_generator import PlapGenerator
+from kk_plap_generator.generator.single_file import SingleFileCache
+from kk_plap_generator.models import ActivableComponentConfig, GroupConfig
+
+
+class PlanNode:
+    """One step of an execution plan, run at most once whatever its number of users."""
+
+    def __init__(
+        self,
+        kind: str,
+        label: str,
+        func: Callable[..., Any],
+        deps: Sequence["PlanNode"] = (),
+    ):
+        self.kind = kind
+        self.label = label
+        self.func = func
+        self.deps = list(deps)
+        self.users = 0
+        self.done = False
+        self.result: Any = None
+
+    def run(self) -> Any:
+        if not self.done:
+            self.result = self.func(*[dep.run() for dep in self.deps])
+            self.done = True
+
+        return self.result
+
+
+class ExecutionPlan:
+    """
+    DAG of the load, index, keyframes, sections, detect and emit steps of a
+    generation run. Steps are keyed by their real inputs, the groups asking for the
+    same step share one node.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[Tuple[str, Hashable], PlanNode] = {}
+        # Counters of the steps, ex. the pruned curve segments of the detect steps
+        self.stats: Counter = Counter()
+
+    def add(
+        self,
+        kind: str,
+        key: Hashable,
+        label: str,
+        func: Callable[..., Any],
+        deps: Sequence[PlanNode] = (),
+    ) -> PlanNode:
+        node = self.nodes.get((kind, key))
+        if node is None:
+            node = PlanNode(kind, label, func, deps)
+            self.nodes[(kind, key)] = node
+        node.users += 1
+
+        return node
+
+    def run(self):
+        # Nodes are added after their dependencies, insertion order is topological
+        for node in self.nodes.values():
+            node.run()
+
+    def format(self) -> str:
+        ids = {id(node): i for i, node in enumerate(self.nodes.values())}
+        lines = []
+        for i, node in enumerate(self.nodes.values()):
+            line = f"[{i}] {node.kind:<9} {node.label}"
+            if node.deps:
+                line += f" <- {', '.join(str(ids[id(dep)]) for dep in node.deps)}"
+            if node.users > 1:
+                line += f" (shared by {node.users})"
+            lines.append(line)
+
+        return "\n".join(lines)
+
+    def __str__(self) -> str:
+        return self.format()
+
+
+def make_plan(
+    groups: Sequence[GroupConfig],
+) -> Tuple[ExecutionPlan, List[PlanNode]]:
+    """Plan of the generation of the groups, with the emit node of each group."""
+    plan = ExecutionPlan()
+    refs = {(group.ref_single_file, group.ref_interpolable) for group in groups}
+    single_files = SingleFileCache(path for path, _ in refs)
+
+    emit_nodes: List[PlanNode] = []
+    for i, group in enumerate(groups):
+        plap_generator = PlapGenerator(
+            interpolable_path=group.ref_interpolable,
+            offset=group.offset,
+            min_pull_out=group.min_pull_out,
+            min_push_in=group.min_push_in,
+            time_ranges=group.time_ranges,
+            component_configs=group.component_configs,
+            exact_crossings=group.exact_crossings,
+        )
+        path = single_files.resolve_path(group.ref_single_file)
+        name = os.path.basename(path)
+
+        file_deps: List[PlanNode] = []
+        if single_files.usages[path] > 1:
+            load = plan.add(
+                "load", path, name, lambda path=path: single_files.get_file(path)
+            )
+            index = plan.add(
+                "index", path, name, lambda single_file: single_file.index, [load]
+            )
+            file_deps.append(index)
+
+        keyframes_key = (path, group.ref_interpolable)
+        keyframes = plan.add(
+            "keyframes",
+            keyframes_key,
+            f"{group.ref_interpolable} in {name}",
+            lambda *_, key=keyframes_key: single_files.get_keyframes(*key),
+            file_deps,
+        )
+
+        time_ranges = tuple(plap_generator.get_time_ranges_ticks())
+        sections_key = (keyframes_key, time_ranges, plap_generator.invert_direction)
+        sections = plan.add(
+            "sections",
+            sections_key,
+            f"{len(time_ranges)} time ranges of {group.ref_interpolable}",
+            plap_generator.make_sections,
+            [keyframes],
+        )
+
+        emit_deps = [sections]
+        if any(
+            isinstance(cc, ActivableComponentConfig) for cc in group.component_configs
+        ):
+            detect_key = (
+                sections_key,
+                plap_generator.min_pull_out,
+                plap_generator.min_push_in,
+                plap_generator.exact_crossings,
+                plap_generator.dense_spacing,
+            )
+            emit_deps.append(
+                plan.add(
+                    "detect",
+                    detect_key,
+                    f"pull out {plap_generator.min_pull_out}, push in {plap_generator.min_push_in}",
+                    functools.partial(plap_generator.get_plap_times, stats=plan.stats),
+                    [sections],
+                )
+            )
+
+        names = ", ".join(cc.name for cc in group.component_configs)
+        emit_nodes.append(
+            plan.add(
+                "emit",
+                i,
+                f"group {i + 1}: {names}",
+                plap_generator.generate_sections_xml,
+                emit_deps,
+            )
+        )
+
+    return plan, emit_nodes
@@ -0,0 +1,135 @@
+from typing import Callable, List, Sequence
+
+from kk_plap_generator.generator.models import KeyframeReference
+
+HOLD = 0
+PUSH_IN = 1
+PULL_OUT = 2
+TOGGLE = PUSH_IN | PULL_OUT
+
+
+def local_extrema(values: Sequence[float]) -> List[int]:
+    """
+    Indexes of the first and last values and of the turning points in between, the
+    values are monotonic from one index to the next.
+    """
+    if not values:
+        return []
+
+    extrema = [0]
+    direction = 0
+    for i, (value, next_value) in enumerate(zip(values, values[1:])):
+        step = (next_value > value) - (next_value < value)
+        if step:
+            if step == -direction:
+                extrema.append(i)
+            direction = step
+    if len(values) > 1:
+        extrema.append(len(values) - 1)
+
+    return extrema
+
+
+def monotonic_flag_changes(
+    flag: Callable[[int], int], start: int, stop: int
+) -> List[int]:
+    """
+    Indexes between ``start`` and ``stop`` that detection needs when the values are
+    monotonic: the first of each run of identical flags and every TOGGLE.
+
+    Each flag covers one range of values, so one run of monotonic values. The end of
+    the runs is found by bisection, ``flag`` gives the flag of the value at an index.
+    """
+    indexes: List[int] = []
+    i = start
+    while i < stop:
+        run_flag = flag(i)
+        indexes.append(i)
+        if run_flag == TOGGLE:
+            i += 1
+            continue
+
+        low, high = i + 1, stop
+        while low < high:
+            middle = (low + high) // 2
+            if flag(middle) == run_flag:
+                low = middle + 1
+            else:
+                high = middle
+        i = low
+
+    return indexes
+
+
+class PlapDetector:
+    """
+    Two thresholds hysteresis (Schmitt trigger) on the distance to the reference.
+
+    A plap registers when the value gets past the reference or closer to it than the
+    push-in threshold, and plaps are only re-enabled once the value pulled away by at
+    least the pull-out threshold. Same rules as ``PlapGenerator.evaluate_is_plap``, with
+    the thresholds computed once per section.
+    """
+
+    def __init__(
+        self,
+        reference: KeyframeReference,
+        min_pull_out: float,
+        min_push_in: float,
+        round_digits: int = 5,
+    ):
+        self.reference = reference
+        self.round_digits = round_digits
+        self.pull_out_threshold = round(
+            min_pull_out * reference.estimated_pull_out, round_digits
+        )
+        self.push_in_threshold = round(
+            (1.0 - min_push_in) * reference.estimated_pull_out, round_digits
+        )
+
+    def classify(self, values: Sequence[float]) -> List[int]:
+        """
+        Flag each value with PUSH_IN (turns plapping on), PULL_OUT (turns it off),
+        TOGGLE (both, flips the state) or HOLD (keeps the state).
+        """
+        ref_value = self.reference.value
+        out_direction = self.reference.out_direction
+        ref_position = ref_value * out_direction
+        push_in, pull_out = self.push_in_threshold, self.pull_out_threshold
+        digits = self.round_digits
+        return [
+            PUSH_IN
+            if value * out_direction <= ref_position
+            else (distance < push_in) | ((distance >= pull_out) << 1)
+            for value in values
+            for distance in (round(abs(ref_value - value), digits),)
+        ]
+
+    def detect(self, times: Sequence[int], values: Sequence[float]) -> List[int]:
+        """Times at which the state goes from not plapping to plapping."""
+        return self.detect_flags(times, self.classify(values))
+
+    def detect_flags(self, times: Sequence[int], flags: Sequence[int]) -> List[int]:
+        """Same as ``detect``, from the flags of the values."""
+        # Only the first of consecutive identical PUSH_IN/PULL_OUT flags can change the
+        # state, every TOGGLE does.
+        active = [i for i, flag in enumerate(flags) if flag != HOLD]
+        changes = [
+            i
+            for i, prev in zip(active, [-1] + active)
+            if prev < 0 or flags[i] == TOGGLE or flags[i] != flags[prev]
+        ]
+
+        plap_times: List[int] = []
+        did_plap = False
+        for i in changes:
+            flag = flags[i]
+            if flag == PULL_OUT:
+                did_plap = False
+            elif not did_plap:
+                plap_times.append(times[i])
+                did_plap = True
+            elif flag == TOGGLE:
+                did_plap = False
+
+        return plap_times
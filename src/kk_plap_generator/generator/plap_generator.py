@@ -1,10 +1,12 @@
-import copy
-import itertools
+import bisect
 import math
 import os
+import statistics
+from collections import Counter
 from typing import (
     Dict,
     List,
+    Optional,
     Sequence,
     Tuple,
     Union,
@@ -12,24 +14,54 @@ from typing import (
 from xml.etree import ElementTree as et
 
 from kk_plap_generator import settings
-from kk_plap_generator.generator.curve_ops import evaluate_curve
+from kk_plap_generator.generator.curve_ops import (
+    CURVE_CACHE,
+    CURVE_CONSTANT,
+    CURVE_GENERAL,
+    CURVE_NUM_POINTS,
+    clean_curve_keyframe,
+    evaluate_curve,
+    evaluate_curve_cached,
+    find_crossings,
+    hermite_bounds,
+    sampled_bounds,
+)
+from kk_plap_generator.generator.events import (
+    EVENT_VALUES,
+    MUTE_LEAD,
+    assign_items,
+    compact_events,
+    decimate_keyframes,
+    make_activable_events,
+    make_preg_plus_events,
+)
 from kk_plap_generator.generator.models import (
+    AXES,
+    EventTable,
+    InterpolableTable,
     KeyframeReference,
-    PlapAxis,
-    PlapFrame,
+    KeyframeTable,
+    SampledTrajectory,
     Section,
 )
+from kk_plap_generator.generator.plap_detector import (
+    TOGGLE,
+    PlapDetector,
+    local_extrema,
+    monotonic_flag_changes,
+)
 from kk_plap_generator.generator.utils import (
-    InfiniteIterator,
-    convert_KKtime_to_seconds,
+    END_TICKS,
+    convert_KKtime_to_ticks,
     convert_seconds_to_KKtime,
+    copy_node,
     keyframe_get,
+    load_template,
+    ticks_to_seconds,
+    to_ticks,
 )
 from kk_plap_generator.generator.xml_node_finder import (
-    NODE_NOT_FOUND,
-    NodeNotFoundError,
-    deep_find_interpolable,
-    deep_find_possible_matches,
+    InterpolableIndex,
     find_node,
 )
 from kk_plap_generator.models import (
@@ -78,6 +110,9 @@ class PlapGenerator:
     """
 
     VALID_PATTERN_CHARS = ["V", "A", "W", "M", "\\", "/"]
+    ROUND_DIGITS = 5
+    # A frame at 30 fps, baked animations have a keyframe every frame
+    DENSE_SPACING = 1 / 30
 
     class Error(Exception):
         pass
@@ -108,13 +143,16 @@ class PlapGenerator:
     class GeneratorResult:
         def __init__(
             self,
-            interpolables: List[et.Element],
+            interpolables: List[InterpolableTable],
             keyframes_count: int,
             time_range: Tuple[str, str],
+            removed_count: int = 0,
         ):
             self.interpolables = interpolables
             self.keyframes_count = keyframes_count
             self.time_range = time_range
+            # Keyframes removed by the decimation of the output
+            self.removed_count = removed_count
 
     def __init__(
         self,
@@ -126,6 +164,8 @@ class PlapGenerator:
         min_push_in: float = 0.8,
         invert_direction: bool = False,
         template_path: str = settings.TEMPLATE_FILE,
+        exact_crossings: bool = False,
+        dense_spacing: float = DENSE_SPACING,
     ):
         self.interpolable_path = interpolable_path
         self.time_ranges = time_ranges
@@ -137,58 +177,63 @@ class PlapGenerator:
         self.min_pull_out = float(min_pull_out)
         self.min_push_in = float(min_push_in)
         self.invert_direction = invert_direction
+        # Find the plaps from the exact threshold crossings of the curves instead of
+        # the sampled trajectory
+        self.exact_crossings = exact_crossings
+        # Sections whose keyframes are this close (seconds, median) are detected
+        # without their curves, 0 turns it off
+        self.dense_spacing = to_ticks(dense_spacing)
         self.component_configs: List[ComponentConfig] = component_configs
         self.template_path = template_path
 
     def generate_xml(
-        self, timeline_xml_tree: et.ElementTree
+        self,
+        timeline_xml_tree: et.ElementTree,
+        index: Optional[InterpolableIndex] = None,
     ) -> List["PlapGenerator.GeneratorResult"]:
         # Get the rythm from source single_file, will use parameters from the config to locate the node
-        root_nodes = list(timeline_xml_tree.getroot())
-        if self.interpolable_path == "":
-            ref_interpolable = NODE_NOT_FOUND
-        else:
-            ref_interpolable = deep_find_interpolable(root_nodes, self.interpolable_path)
-
-        while ref_interpolable is NODE_NOT_FOUND and root_nodes:
-            if len(root_nodes) == 1:
-                if root_nodes[0].tag == "interpolable":
-                    ref_interpolable = root_nodes[0]
-                else:
-                    root_nodes = list(root_nodes[0])
-            else:
-                root_nodes = []
+        if index is None:
+            index = InterpolableIndex(timeline_xml_tree.getroot())
+        ref_interpolable = index.find(self.interpolable_path)
 
-        if ref_interpolable is NODE_NOT_FOUND:
-            possible_matches = deep_find_possible_matches(
-                list(timeline_xml_tree.getroot()), "alias"
-            )
-            raise NodeNotFoundError(
-                "interpolable",
-                "alias",
-                self.interpolable_path,
-                suggestions=possible_matches,
-            )
+        return self.generate_interpolable_xml(ref_interpolable)
 
+    def generate_interpolable_xml(
+        self, ref_interpolable: Union[et.Element, KeyframeTable]
+    ) -> List["PlapGenerator.GeneratorResult"]:
         # Separate the keyframes into sections based on the time ranges
+        if not isinstance(ref_interpolable, KeyframeTable):
+            ref_interpolable = KeyframeTable.from_keyframes(ref_interpolable)
         sections: List[Section] = self.make_sections(ref_interpolable)
 
+        return self.generate_sections_xml(sections)
+
+    def generate_sections_xml(
+        self,
+        sections: List["Section"],
+        keyframe_times: Optional[List[int]] = None,
+    ) -> List["PlapGenerator.GeneratorResult"]:
         # Get the base nodes from template
-        template_tree = et.parse(
+        template_root = load_template(
             os.path.join(os.path.dirname(os.path.abspath(__file__)), self.template_path)
         )
-        self._clean_xml(template_tree.getroot())
+        CURVE_CACHE.prewarm(template_root)
 
         # Generate the keyframes for each component
         results: List[PlapGenerator.GeneratorResult] = []
-        for ac in (
+        activable_configs = [
             cc
             for cc in self.component_configs
             if isinstance(cc, ActivableComponentConfig)
-        ):
+        ]
+        # The plap times only depend on the sections, every component shares them
+        if keyframe_times is None:
+            keyframe_times = self.get_plap_times(sections) if activable_configs else []
+
+        for ac in activable_configs:
             results.append(
                 self.generate_activable_component_xml(
-                    copy.deepcopy(template_tree.getroot()), sections, ac
+                    template_root, sections, ac, keyframe_times
                 )
             )
 
@@ -196,9 +241,7 @@ class PlapGenerator:
             cc for cc in self.component_configs if isinstance(cc, PregPlusComponentConfig)
         ):
             results.append(
-                self.generate_preg_plus_component_xml(
-                    copy.deepcopy(template_tree.getroot()), sections, ppc
-                )
+                self.generate_preg_plus_component_xml(template_root, sections, ppc)
             )
 
         return results
@@ -211,79 +254,81 @@ class PlapGenerator:
     ) -> "PlapGenerator.GeneratorResult":
         base_interpolable, in_keyframe, out_keyframe = self.make_preg_plus_nodes(root, pc)
         base_interpolable.set("alias", f"{pc.name}")
+        interpolable = InterpolableTable(base_interpolable, [in_keyframe, out_keyframe])
+        # Keyframes of the template without curve take the one of their keyframe
+        reference_templates: Dict[int, int] = {}
+        in_curve = tuple(clean_curve_keyframe(ckf) for ckf in in_keyframe)
+        out_curve = tuple(clean_curve_keyframe(ckf) for ckf in out_keyframe)
 
         # For each keyframe in the sections, we assign a value between pc.min_value and pc.max_value
         # based on the distance from the reference keyframe.
+        keyframe_times: List[int] = []
+        preg_plus_values: List[int] = []
+        templates: List[int] = []
+        removed_count = 0
         for section in sections:
             reference = section.reference
-            is_plap = False
-            plaps: List[et.Element] = []
-
-            for keyframe in section.keyframes:
-                value = keyframe_get(keyframe, reference.axis)
-                distance = self._calculate_distance(
-                    reference.value, value, reference.out_direction
-                )
-                # if (
-                #     value * reference.out_direction
-                #     < reference.value * reference.out_direction
-                # ):
-                #     preg_value = pc.max_value
-                #     is_plap = True
-                if distance > reference.estimated_pull_out:
-                    preg_value = pc.min_value
-                    is_plap = False
-                else:
-                    preg_value = int(
-                        max(reference.estimated_pull_out - distance, 0.0)
-                        / reference.estimated_pull_out
-                        * pc.max_value
-                    )
-                    preg_value = max(preg_value, pc.min_value)
-                    is_plap = self.evaluate_is_plap(reference, value, is_plap)
-
-                time_actual = keyframe_get(keyframe, "time") + self.offset + pc.offset
-                # Remove overlapping keyframes
-                for prev_index in range(len(plaps) - 1, -1, -1):
-                    if keyframe_get(plaps[prev_index], "time") >= time_actual - 0.05:
-                        plaps.pop(prev_index)
-                    else:
-                        break
-
-                new_keyframe = (
-                    copy.deepcopy(out_keyframe) if is_plap else copy.deepcopy(in_keyframe)
+            keyframes = section.keyframes
+            kept, times, preg_values, is_plaps = make_preg_plus_events(
+                keyframes.time,
+                keyframes.axis(reference.axis_index),
+                self.make_detector(reference),
+                to_ticks(self.offset) + to_ticks(pc.offset),
+                pc.min_value,
+                pc.max_value,
+                min_gap=to_ticks(0.05),
+                round_digits=self.ROUND_DIGITS,
+            )
+            if pc.decimate:
+                # Timeline interpolates each keyframe with its curve
+                curves = [
+                    (out_curve if is_plap else in_curve) or tuple(keyframes.curve(i))
+                    for i, is_plap in zip(kept, is_plaps)
+                ]
+                decimated = decimate_keyframes(
+                    times, preg_values, pc.decimation_tolerance, curves
                 )
-
-                new_keyframe.set("time", str(time_actual))
-                new_keyframe.set("value", str(preg_value))
-
-                if len(list(new_keyframe)) == 0:
-                    for curve_keyframe in list(keyframe):
-                        new_keyframe.append(copy.deepcopy(curve_keyframe))
-
-                is_plap = not is_plap
-                plaps.append(new_keyframe)
-
-            base_interpolable.extend(plaps)
-
-        for child in list(base_interpolable):
-            if keyframe_get(child, "time") > 0.5:
-                first_keyframe = copy.deepcopy(in_keyframe)
-                first_keyframe.set("time", str(0.0))
-                first_keyframe.set("value", str(0))
-                base_interpolable.insert(0, first_keyframe)
-
-            break
+                removed_count += len(kept) - len(decimated)
+                kept = [kept[i] for i in decimated]
+                times = [times[i] for i in decimated]
+                preg_values = [preg_values[i] for i in decimated]
+                is_plaps = [is_plaps[i] for i in decimated]
+
+            for i, is_plap in zip(kept, is_plaps):
+                template = int(is_plap)
+                if len(interpolable.templates[template]) == 0:
+                    # Same curve as the reference keyframe
+                    node = keyframes.nodes[i]
+                    if id(node) not in reference_templates:
+                        reference_template = copy_node(interpolable.templates[template])
+                        reference_template.extend(node)
+                        reference_templates[id(node)] = interpolable.add_template(
+                            reference_template
+                        )
+                    template = reference_templates[id(node)]
+                templates.append(template)
+            keyframe_times.extend(times)
+            preg_plus_values.extend(preg_values)
+
+        if keyframe_times and keyframe_times[0] > to_ticks(0.5):
+            interpolable.append(0, 0, 0)
+        for time, preg_value, template in zip(
+            keyframe_times, preg_plus_values, templates
+        ):
+            interpolable.append(time, preg_value, template)
 
         return PlapGenerator.GeneratorResult(
-            [base_interpolable],
-            len(list(base_interpolable)),  # Keyframes count
+            [interpolable],
+            len(interpolable),  # Keyframes count
             (  # Time range
-                convert_seconds_to_KKtime(keyframe_get(sections[0].keyframes[0], "time")),
                 convert_seconds_to_KKtime(
-                    keyframe_get(sections[-1].keyframes[-1], "time")
+                    ticks_to_seconds(sections[0].keyframes.time[0])
+                ),
+                convert_seconds_to_KKtime(
+                    ticks_to_seconds(sections[-1].keyframes.time[-1])
                 ),
             ),
+            removed_count,
         )
 
     def generate_activable_component_xml(
@@ -291,6 +336,7 @@ class PlapGenerator:
         root: et.Element,
         sections: List["Section"],
         ac: ActivableComponentConfig,
+        keyframe_times: Optional[List[int]] = None,
     ) -> "PlapGenerator.GeneratorResult":
         base_sfx, sfx_keyframe = self.make_activable_nodes(root, ac)
 
@@ -301,106 +347,278 @@ class PlapGenerator:
             sequence = self.generate_sequence(self.VALID_PATTERN_CHARS[0], 1)
 
         # We find at what time the activable component should be triggered
-        keyframe_times: List[float] = []
-        for section in sections:
-            keyframe_times += self.get_plaps_from_keyframes(
-                section.reference, section.keyframes
-            )
+        if keyframe_times is None:
+            keyframe_times = self.get_plap_times(sections)
 
         item_configs: List[ActivableComponentConfig] = (
             ac.item_configs if isinstance(ac, MultiActivableComponentConfig) else [ac]
         )
-        keyframes_groups: List[List[et.Element]] = [[] for _ in range(len(item_configs))]
-        offset = self.offset + ac.offset
-
-        # Generate the keyframes
-        for i, time in zip(InfiniteIterator(sequence), keyframe_times):
-            plaps = keyframes_groups[i]
-            pc = item_configs[i]
-            time_actual = time + offset + pc.offset
-            # Remove overlapping keyframes
-            for prev_index in range(len(plaps) - 1, -1, -1):
-                if keyframe_get(plaps[prev_index], "time") >= time_actual - 0.1:
-                    plaps.pop(prev_index)
-                else:
-                    break
-
-            mute_keyframe = copy.deepcopy(sfx_keyframe)
-            mute_keyframe.set("time", str(time_actual - 0.05))
-            mute_keyframe.set("value", "false")
-            new_keyframe = copy.deepcopy(sfx_keyframe)
-            new_keyframe.set("time", str(time_actual))
-            new_keyframe.set("value", "true")
-
-            plaps.append(mute_keyframe)
-            plaps.append(new_keyframe)
+        events = self.make_activable_events(keyframe_times, ac, item_configs, sequence)
 
-            if 0 < ac.cutoff < math.inf:
-                cutoff = (ac.cutoff + pc.cutoff) if pc.cutoff < math.inf else ac.cutoff
-            else:
-                cutoff = pc.cutoff
-
-            if 0 < cutoff < math.inf:
-                cutoff_keyframe = copy.deepcopy(sfx_keyframe)
-                cutoff_keyframe.set("time", str(time + offset + pc.offset + cutoff))
-                cutoff_keyframe.set("value", "false")
-                plaps.append(cutoff_keyframe)
-
-        # Create the interpolables
-        interpolables: List[et.Element] = []
+        # Create the interpolables, their keyframes are written from the events
+        interpolables: List[InterpolableTable] = []
         for i, ic in enumerate(item_configs):
-            p: et.Element = copy.deepcopy(base_sfx)
+            p: et.Element = copy_node(base_sfx)
             p.set("alias", f"{ic.name}")
             p.set("objectIndex", f"{p.get('objectIndex')}{i + 1}")
-            p.extend(keyframes_groups[i])
-            interpolables.append(p)
+            interpolable = InterpolableTable(p, [sfx_keyframe])
+            for row in events.segment(i):
+                interpolable.append(events.time[row], EVENT_VALUES[events.kind[row]])
+            interpolables.append(interpolable)
 
         return PlapGenerator.GeneratorResult(
             interpolables,
             len(keyframe_times),
             (
-                convert_seconds_to_KKtime(keyframe_times[0]),
-                convert_seconds_to_KKtime(keyframe_times[-1]),
+                convert_seconds_to_KKtime(ticks_to_seconds(keyframe_times[0])),
+                convert_seconds_to_KKtime(ticks_to_seconds(keyframe_times[-1])),
             )
             if keyframe_times
             else ("00:00:00", "00:00:00"),
         )
 
+    def make_activable_events(
+        self,
+        keyframe_times: List[int],
+        ac: ActivableComponentConfig,
+        item_configs: List[ActivableComponentConfig],
+        sequence: List[int],
+    ) -> EventTable:
+        item_cutoffs: List[int] = []
+        for pc in item_configs:
+            if 0 < ac.cutoff < math.inf:
+                cutoff = (ac.cutoff + pc.cutoff) if pc.cutoff < math.inf else ac.cutoff
+            else:
+                cutoff = pc.cutoff
+            item_cutoffs.append(to_ticks(cutoff) if 0 < cutoff < math.inf else 0)
+
+        events = make_activable_events(
+            keyframe_times,
+            assign_items(len(keyframe_times), sequence),
+            to_ticks(self.offset) + to_ticks(ac.offset),
+            [to_ticks(pc.offset) for pc in item_configs],
+            item_cutoffs,
+            min_gap=to_ticks(0.1),
+            mute_lead=MUTE_LEAD,
+        )
+        # Drop the keyframes that don't change the on/off state
+        return compact_events(events, to_ticks(ac.frame_tick))
+
+    def get_plap_times(
+        self, sections: List["Section"], stats: Optional[Counter] = None
+    ) -> List[int]:
+        keyframe_times: List[int] = []
+        for section in sections:
+            if self.exact_crossings:
+                keyframe_times += self.get_plaps_from_crossings(
+                    section.reference, section.keyframes
+                )
+            elif self.is_dense(section.keyframes):
+                if stats is not None:
+                    stats["dense_sections"] += 1
+                keyframe_times += self.get_plaps_from_dense_keyframes(
+                    section.reference, section.keyframes
+                )
+            else:
+                keyframe_times += self.get_plaps_from_segments(
+                    section.reference, section.keyframes, stats
+                )
+
+        return keyframe_times
+
+    def get_plaps_from_segments(
+        self,
+        reference: "KeyframeReference",
+        keyframes: "KeyframeTable",
+        stats: Optional[Counter] = None,
+    ) -> List[int]:
+        # Same samples as the trajectory, except for the segments whose bounds are
+        # within a single detector flag: their keyframe stands for all their samples.
+        detector = self.make_detector(reference)
+        times, values = keyframes.time, keyframes.axis(reference.axis_index)
+        digits = self.ROUND_DIGITS
+        sample_times: List[int] = []
+        sample_values: List[float] = []
+        segments_count = pruned_count = 0
+        for i in range(len(keyframes) - 1):
+            left_time, left_value = times[i], values[i]
+            sample_times.append(left_time)
+            sample_values.append(left_value)
+            curve = tuple(keyframes.curve(i))
+            if len(curve) < 2:
+                continue
+
+            segments_count += 1
+            diff = values[i + 1] - left_value
+            low, high = (
+                round(left_value + diff * progress, digits)
+                for progress in hermite_bounds(curve)
+            )
+            flags = detector.classify(
+                [min(left_value, low, high), max(left_value, low, high)]
+            )
+            # Every TOGGLE sample flips the state, these segments can't be skipped
+            if flags[0] == flags[1] != TOGGLE:
+                pruned_count += 1
+                continue
+
+            span = times[i + 1] - left_time
+            c_times, c_values = evaluate_curve_cached(curve)
+            if keyframes.curve_kind[i] == CURVE_GENERAL:
+                sample_times.extend([left_time + round(t * span) for t in c_times])
+                sample_values.extend(
+                    [round(left_value + diff * v, digits) for v in c_values]
+                )
+            else:
+                # The samples of flat and linear curves are monotonic
+                rows = self._flag_changes(detector, c_values, left_value, diff)
+                sample_times.extend([left_time + round(c_times[j] * span) for j in rows])
+                sample_values.extend(
+                    [round(left_value + diff * c_values[j], digits) for j in rows]
+                )
+
+        if stats is not None:
+            stats["segments"] += segments_count
+            stats["pruned_segments"] += pruned_count
+
+        return detector.detect(sample_times, sample_values)
+
+    def _flag_changes(
+        self,
+        detector: PlapDetector,
+        c_values: Sequence[float],
+        left_value: float,
+        diff: float,
+    ) -> List[int]:
+        """Samples of a curve that detection needs, each curve segment is monotonic."""
+        digits = self.ROUND_DIGITS
+
+        def flag(j: int) -> int:
+            return detector.classify([round(left_value + diff * c_values[j], digits)])[0]
+
+        rows: List[int] = []
+        for start in range(0, len(c_values), CURVE_NUM_POINTS):
+            stop = min(start + CURVE_NUM_POINTS, len(c_values))
+            rows += monotonic_flag_changes(flag, start, stop)
+
+        return rows
+
+    def get_plaps_from_dense_keyframes(
+        self,
+        reference: "KeyframeReference",
+        keyframes: "KeyframeTable",
+    ) -> List[int]:
+        # Baked animations have a keyframe every frame, their curves are ignored and
+        # the keyframes are detected as is. Between two local extrema the values are
+        # monotonic, only the keyframes where the detector flag changes are needed.
+        detector = self.make_detector(reference)
+        times, values = keyframes.time, keyframes.axis(reference.axis_index)
+
+        def flag(j: int) -> int:
+            return detector.classify([values[j]])[0]
+
+        extrema = local_extrema(values)
+        rows: List[int] = []
+        for start, stop in zip(extrema, extrema[1:]):
+            rows += monotonic_flag_changes(flag, start, stop)
+        rows += extrema[-1:]
+
+        return detector.detect([times[j] for j in rows], [values[j] for j in rows])
+
+    def is_dense(self, keyframes: "KeyframeTable") -> bool:
+        """Whether the median spacing of the keyframes is at most ``dense_spacing``."""
+        times = keyframes.time
+        if self.dense_spacing <= 0 or len(times) < 3:
+            return False
+
+        return (
+            statistics.median_low(b - a for a, b in zip(times, times[1:]))
+            <= self.dense_spacing
+        )
+
     def get_plaps_from_keyframes(
         self,
         reference: "KeyframeReference",
-        keyframes: Sequence[et.Element],
-    ) -> List[float]:
-        keyframe_times: List[float] = []
-        did_plap = False
+        keyframes: Union["KeyframeTable", Sequence[et.Element]],
+    ) -> List[int]:
+        if not isinstance(keyframes, KeyframeTable):
+            keyframes = KeyframeTable.from_keyframes(keyframes)
+
+        return self.get_plaps_from_trajectory(
+            reference, self.sample_trajectory(keyframes)
+        )
+
+    def get_plaps_from_trajectory(
+        self,
+        reference: "KeyframeReference",
+        trajectory: "SampledTrajectory",
+    ) -> List[int]:
         # out direction 1 means the reference is pulling away by increasing his axis value
         # (ex. out direction 1) impact at X:0.0, pulling away to X:1.0
         # (ex. out direction -1) impact at X:0.0, pulling away to X:-1.0
         # (ex. out direction 1) impact at X:-2.0, pulling away to X:7.0
         # (ex. out direction -1) impact at X:-2.0, pulling away to X:-9.0
+        return self.make_detector(reference).detect(
+            trajectory.time, trajectory.axis(reference.axis_index)
+        )
 
-        for keyframe, next_kf in zip(keyframes, itertools.islice(keyframes, 1, None)):
-            plapframes = self._convert_to_plapframes(
-                [keyframe, next_kf], PlapAxis(reference.axis)
+    def get_plaps_from_crossings(
+        self,
+        reference: "KeyframeReference",
+        keyframes: "KeyframeTable",
+    ) -> List[int]:
+        # The detector flags only change where the value crosses the reference or one
+        # of the thresholds, each curve segment is solved for these crossings and the
+        # detector gets one value per interval between them. Values are rounded before
+        # being classified, the crossings are searched half a rounding unit around.
+        detector = self.make_detector(reference)
+        half_unit = 0.5 * 10.0**-self.ROUND_DIGITS
+        thresholds = [
+            reference.value + (distance + rounding) * reference.out_direction
+            for distance in (
+                0.0,
+                detector.push_in_threshold,
+                detector.pull_out_threshold,
             )
-            for plapframe in plapframes:
-                will_plap = self.evaluate_is_plap(reference, plapframe.value, did_plap)
-                if did_plap and not will_plap:
-                    did_plap = False
-                elif not did_plap and will_plap:
-                    keyframe_times.append(plapframe.time)
-                    did_plap = True
+            for rounding in (-half_unit, half_unit)
+        ]
+        times, values = keyframes.time, keyframes.axis(reference.axis_index)
+        crossing_times: List[int] = []
+        crossing_values: List[float] = []
+        for i in range(len(keyframes) - 1):
+            left_time, left_value = times[i], values[i]
+            span = times[i + 1] - left_time
+            diff = values[i + 1] - left_value
+            crossing_times.append(left_time)
+            crossing_values.append(left_value)
+            if diff == 0.0:
+                continue
+
+            targets = [(threshold - left_value) / diff for threshold in thresholds]
+            for time, progress in find_crossings(keyframes.curve(i), targets):
+                crossing_times.append(left_time + round(time * span))
+                crossing_values.append(self._round(left_value + diff * progress))
+
+        flags = detector.classify(crossing_values)
+        # A value in a toggling interval flips the state once, not once per sample
+        changes = [i for i, flag in enumerate(flags) if i == 0 or flag != flags[i - 1]]
+        return detector.detect_flags(
+            [crossing_times[i] for i in changes], [flags[i] for i in changes]
+        )
 
-        return keyframe_times
+    def make_detector(self, reference: "KeyframeReference") -> PlapDetector:
+        return PlapDetector(
+            reference, self.min_pull_out, self.min_push_in, self.ROUND_DIGITS
+        )
 
     def get_plaps_from_curve_keyframes(
         self,
         reference: "KeyframeReference",
         curve_keyframes: List[et.Element],
         curve_reference: et.Element,
-    ) -> Tuple[bool, List[float]]:
+    ) -> Tuple[bool, List[int]]:
         # We will evaluate the curve keyframes to see if there are any plaps in the interpolation curve.
-        keyframe_times: List[float] = []
+        keyframe_times: List[int] = []
         did_plap = False
         if not curve_keyframes:
             return did_plap, keyframe_times
@@ -422,9 +640,12 @@ class PlapGenerator:
                     or value * reference.out_direction
                     >= reference.value * reference.out_direction
                 ):
-                    time_diff = reference.time - keyframe_get(curve_reference, "time")
-                    time_offset = time_diff * (1.0 - time)
-                    keyframe_times.append(self._round(reference.time - time_offset))
+                    time_diff = reference.time - to_ticks(
+                        keyframe_get(curve_reference, "time")
+                    )
+                    keyframe_times.append(
+                        reference.time - round(time_diff * (1.0 - time))
+                    )
                     did_plap = True
             elif did_plap and not will_plap:
                 did_plap = False
@@ -465,58 +686,64 @@ class PlapGenerator:
         else:
             return did_plap
 
-    def make_sections(self, ref_interpolable: et.Element) -> List["Section"]:
+    def make_sections(
+        self, ref_interpolable: Union[et.Element, "KeyframeTable"]
+    ) -> List["Section"]:
         sections: List[Section] = []
-        keyframes = list(ref_interpolable)
-        if not keyframes:
+        if isinstance(ref_interpolable, KeyframeTable):
+            keyframes = ref_interpolable
+        else:
+            keyframes = KeyframeTable.from_keyframes(ref_interpolable)
+        if not len(keyframes):
             return sections
 
-        for time_start, time_end, ref_time in self.get_time_ranges_sec():
-            kfs: List[et.Element] = []
-            ref_kfs = None
-            prev_kf = keyframes[0]
-
-            if ref_time < keyframe_get(prev_kf, "time"):
-                ref_time = keyframe_get(prev_kf, "time")
-            if time_start < keyframe_get(prev_kf, "time"):
-                time_start = keyframe_get(prev_kf, "time")
-
-            # Get the keyframes that are within the time range
-            for i, kf in enumerate(keyframes):
-                time = keyframe_get(kf, "time")
-                if (
-                    self._std_time(time_start) - 0.00001 <= time
-                    and self._std_time(time) <= time_end + 0.00001
-                ):
-                    if not kfs:
-                        kfs.append(prev_kf)
-
-                    kfs.append(kf)
-
-                if ref_time >= self._std_time(time) - 0.00001:
-                    ref_kfs = (prev_kf, kf, keyframes[i + 1])
-
-                prev_kf = kf
-
-            if kfs:
-                if self._std_time(ref_time) == self._std_time(time_start):
-                    try:
-                        ref_kfs = (kfs[0], kfs[1], kfs[2])
-                    except IndexError:
-                        raise IndexError(
-                            "The reference keyframe cannot be the last or only keyframe in the Time Range."
-                        )
-                elif ref_kfs is None:
-                    raise self.ReferenceNotFoundError(convert_seconds_to_KKtime(ref_time))
-                if settings.IS_DEV:
-                    print(
-                        f"k0: {keyframe_get(kfs[0], 'time')} k1: {keyframe_get(kfs[1], 'time')} k2: {keyframe_get(kfs[2], 'time')}"
-                    )
-                    print(
-                        f"ref_time: {ref_time} ref_kfs0: {keyframe_get(ref_kfs[0], 'time')} ref_kfs1: {keyframe_get(ref_kfs[1], 'time')} ref_kfs2: {keyframe_get(ref_kfs[2], 'time')}"
+        # Sorted time index, each range is located with binary searches
+        keyframes = keyframes.sorted_by_time()
+        times = keyframes.time
+        for time_start, time_end, ref_time in self.get_time_ranges_ticks():
+            if ref_time < times[0]:
+                ref_time = times[0]
+            if time_start < times[0]:
+                time_start = times[0]
+
+            # Get the keyframes that are within the time range, plus the preceding one.
+            # Times are exact ticks, so both bounds are inclusive as they are.
+            start = bisect.bisect_left(times, time_start)
+            stop = bisect.bisect_right(times, time_end)
+            if start >= stop:
+                continue
+
+            kfs = [max(start - 1, 0), *range(start, stop)]
+            # The reference is the last keyframe at or before the reference time
+            ref_i = bisect.bisect_right(times, ref_time) - 1
+            ref_kfs = (max(ref_i - 1, 0), ref_i, ref_i + 1) if ref_i >= 0 else None
+            ref_segment = ref_i - start if start <= ref_i < stop else None
+
+            if ref_time == time_start:
+                try:
+                    ref_kfs = (kfs[0], kfs[1], kfs[2])
+                    ref_segment = 0
+                except IndexError:
+                    raise IndexError(
+                        "The reference keyframe cannot be the last or only keyframe in the Time Range."
                     )
-                reference = self.get_reference(ref_kfs, ref_time, kfs)
-                sections.append(Section(reference, kfs))
+            elif ref_kfs is None:
+                raise self.ReferenceNotFoundError(
+                    convert_seconds_to_KKtime(ticks_to_seconds(ref_time))
+                )
+            if settings.IS_DEV:
+                print(f"k0: {times[kfs[0]]} k1: {times[kfs[1]]} k2: {times[kfs[2]]}")
+                print(
+                    f"ref_time: {ref_time} ref_kfs0: {times[ref_kfs[0]]} ref_kfs1: {times[ref_kfs[1]]} ref_kfs2: {times[ref_kfs[2]]}"
+                )
+            section_keyframes = keyframes.take(kfs)
+            reference = self.get_reference(
+                keyframes.take(ref_kfs),
+                ref_time,
+                section_keyframes,
+                ref_segment=ref_segment,
+            )
+            sections.append(Section(reference, section_keyframes, self.sample_trajectory))
 
         return sections
 
@@ -533,58 +760,64 @@ class PlapGenerator:
 
     def get_reference(
         self,
-        ref_nodes: Tuple[et.Element, et.Element, et.Element],
-        ref_time: float,
-        node_list: Sequence[et.Element],
+        ref_nodes: "KeyframeTable",
+        ref_time: int,
+        node_list: "KeyframeTable",
+        ref_segment: Optional[int] = None,
     ) -> "KeyframeReference":
+        # Only the segment of the reference is sampled
+        if ref_segment is None:
+            ref_trajectory = self.sample_trajectory(ref_nodes, 0, 2)
+        else:
+            ref_trajectory = self.sample_trajectory(
+                node_list, ref_segment, ref_segment + 2
+            )
+
         # The first keyframe of a time range should be a keyframe where the two bodies collide.
         # Here it's second because we add the preceding frame for curve evaluation.
-        axis = PlapAxis()
-        plap_frames = self._convert_to_plapframes(ref_nodes[:2], axis)
-        reference: PlapFrame = plap_frames[-1]
-        for frame in plap_frames:
-            if frame.time <= ref_time:
-                reference = frame
+        indexes = ref_trajectory.segment(0)
+        ref_index = indexes[-1]
+        for i in indexes:
+            if ref_trajectory.time[i] <= ref_time:
+                ref_index = i
             else:
                 break
+        reference_time = ref_trajectory.time[ref_index]
 
         if settings.IS_DEV:
             print(
-                f"ref time{ref_time} ref_nodes1:{ref_nodes[0].get('time')} ref_nodes2:{ref_nodes[1].get('time')} ref_nodes3:{ref_nodes[2].get('time')} plap{reference.time}"
+                f"ref time{ref_time} ref_nodes1:{ref_nodes.time[0]} ref_nodes2:{ref_nodes.time[1]} ref_nodes3:{ref_nodes.time[2]} plap{reference_time}"
             )
             print(
-                f"ref_node_X{ref_nodes[1].get('valueX')} ref_node_Y{ref_nodes[1].get('valueY')} ref_node_Z{ref_nodes[1].get('valueZ')}"
+                f"ref_node_X{ref_nodes.valueX[1]} ref_node_Y{ref_nodes.valueY[1]} ref_node_Z{ref_nodes.valueZ[1]}"
             )
             print(
-                f"ref_next_X{ref_nodes[2].get('valueX')} ref_next_Y{ref_nodes[2].get('valueY')} ref_next_Z{ref_nodes[2].get('valueZ')}"
+                f"ref_next_X{ref_nodes.valueX[2]} ref_next_Y{ref_nodes.valueY[2]} ref_next_Z{ref_nodes.valueZ[2]}"
             )
 
             print(
-                f"plap_X{reference.valueX} plap_Y{reference.valueY} plap_Z{reference.valueZ}"
+                f"plap_X{ref_trajectory.valueX[ref_index]} plap_Y{ref_trajectory.valueY[ref_index]} plap_Z{ref_trajectory.valueZ[ref_index]}"
             )
         # We check the next keyframe and calculate the difference between reference and next_keyframe.
         # The axis with the biggest difference will be our axis reference.
         # We also use the difference to determnine the direction of the pull out as 1 or -1.
-        next_frame = ref_nodes[2]
-
-        x = keyframe_get(next_frame, "valueX") - keyframe_get(ref_nodes[1], "valueX")
-        y = keyframe_get(next_frame, "valueY") - keyframe_get(ref_nodes[1], "valueY")
-        z = keyframe_get(next_frame, "valueZ") - keyframe_get(ref_nodes[1], "valueZ")
+        x = ref_nodes.valueX[2] - ref_nodes.valueX[1]
+        y = ref_nodes.valueY[2] - ref_nodes.valueY[1]
+        z = ref_nodes.valueZ[2] - ref_nodes.valueZ[1]
 
         if abs(z) < abs(x) > abs(y):
-            axis.value = "valueX"
+            axis_index = 0  # valueX
             # out_direction = x / abs(x)
-            # value_diff = keyframe_get(ref_nodes[1], "valueX") - keyframe_get(next_frame, "valueX")
         elif abs(z) < abs(y) > abs(x):
-            axis.value = "valueY"
+            axis_index = 1  # valueY
             # out_direction = y / abs(y)
-            # value_diff = keyframe_get(ref_nodes[1], "valueY") - keyframe_get(next_frame, "valueY")
         else:
-            axis.value = "valueZ"
+            axis_index = 2  # valueZ
             # out_direction = z / abs(z)
-            # value_diff = keyframe_get(ref_nodes[1], "valueZ") - keyframe_get(next_frame, "valueZ")
 
-        if keyframe_get(next_frame, axis.value) > keyframe_get(ref_nodes[1], axis.value):
+        axis = AXES[axis_index]
+        ref_values = ref_nodes.axis(axis_index)
+        if ref_values[2] > ref_values[1]:
             out_direction = 1.0
         else:
             out_direction = -1.0
@@ -593,45 +826,47 @@ class PlapGenerator:
             out_direction *= -1.0
 
         # We then try and estimate the pull out distance by taking the biggest difference
-        # between the reference keyframe other keyframes, using the curve keyframes
+        # between the reference keyframe other keyframes, using the curve keyframes.
+        # Samples are monotonic in the curve value, the furthest sample of a segment is
+        # the one of the lowest or highest curve value.
+        # Dense sections are detected on the keyframe values only, and so is their estimate.
+        use_curves = self.exact_crossings or not self.is_dense(node_list)
         compare_func = min if out_direction == -1 else max
         estimated_pull_out = 0.0
+        reference_value = ref_trajectory.axis(axis_index)[ref_index]
+        values = node_list.axis(axis_index)
         for i in range(len(node_list) - 1):
-            kf = node_list[i]
-            value = keyframe_get(kf, axis.value)
-            value_diff = keyframe_get(node_list[i + 1], axis.value) - value
-            value = compare_func(
-                (
-                    value,
-                    *(
-                        value + value_diff * v
-                        for v in evaluate_curve(list(node_list[i]))[1]
-                    ),
+            value = values[i]
+            bounds = sampled_bounds(tuple(node_list.curve(i))) if use_curves else None
+            if bounds is not None:
+                diff = values[i + 1] - value
+                progress = bounds[1] if (diff >= 0) == (out_direction == 1) else bounds[0]
+                value = compare_func(
+                    value, round(value + diff * progress, self.ROUND_DIGITS)
                 )
-            )
-            estimated_pull_out = max(estimated_pull_out, abs(value - reference.value))
+            estimated_pull_out = max(estimated_pull_out, abs(value - reference_value))
 
-        reference.value = self._round(reference.value)
+        reference_value = self._round(reference_value)
 
         if estimated_pull_out == 0.0:
             raise ValueError(
                 "Could not estimate the pull out distance with available data"
                 + f"\n> node_list length: {len(node_list)}"
                 + f"\n> axis: {axis}"
-                + f"\n> ref_value: {reference.value}"
+                + f"\n> ref_value: {reference_value}"
             )
         elif settings.IS_DEV:
             print(
-                f"Estimated pull out distance for {axis} at {reference.time}: {estimated_pull_out}"
-                + f"\n> ref_value: {reference.value}"
+                f"Estimated pull out distance for {axis} at {reference_time}: {estimated_pull_out}"
+                + f"\n> ref_value: {reference_value}"
                 + f"\n> out_direction: {out_direction}"
                 + f"\n> axis: {axis}"
             )
 
         return KeyframeReference(
-            value=reference.value,
-            time=reference.time,
-            axis=axis.value,
+            value=reference_value,
+            time=reference_time,
+            axis=axis,
             out_direction=out_direction,
             estimated_pull_out=self._round(estimated_pull_out),
         )
@@ -657,84 +892,72 @@ class PlapGenerator:
     def make_preg_plus_nodes(
         self, root: et.Element, pc: PregPlusComponentConfig
     ) -> Tuple[et.Element, et.Element, et.Element]:
-        base_interpolable = find_node(root, "interpolable[@alias='Preg+']")
+        # The template root is shared, only work on copies of its nodes
+        template_interpolable = find_node(root, "interpolable[@alias='Preg+']")
+        base_interpolable = copy_node(template_interpolable)
         base_interpolable.set("alias", f"{pc.name}")
 
-        in_keyframe = find_node(base_interpolable, f"keyframe[@alias='{pc.in_curve}']")
+        in_keyframe = copy_node(
+            find_node(template_interpolable, f"keyframe[@alias='{pc.in_curve}']")
+        )
         in_keyframe.set("value", str(pc.min_value))
 
-        out_keyframe = find_node(base_interpolable, f"keyframe[@alias='{pc.out_curve}']")
+        out_keyframe = copy_node(
+            find_node(template_interpolable, f"keyframe[@alias='{pc.out_curve}']")
+        )
         out_keyframe.set("value", str(pc.max_value))
 
         # Remove the template keyframes from our base node
-        for child in list(base_interpolable):
-            base_interpolable.remove(child)
-
-        root.remove(base_interpolable)
+        del base_interpolable[:]
 
         return base_interpolable, in_keyframe, out_keyframe
 
     def make_activable_nodes(
         self, root: et.Element, ac: ActivableComponentConfig
     ) -> Tuple[et.Element, et.Element]:
-        base_sfx: et.Element = find_node(root, "interpolable[@alias='3DSE']")
+        # The template root is shared, only work on copies of its nodes
+        template_sfx = find_node(root, "interpolable[@alias='3DSE']")
+        base_sfx = copy_node(template_sfx)
         base_sfx.set("alias", f"{ac.name}")
 
-        sfx_keyframe = find_node(base_sfx, "keyframe")
+        sfx_keyframe = copy_node(find_node(base_sfx, "keyframe"))
         sfx_keyframe.set("value", "false")
 
         # Remove the template keyframes from our base plap node
-        for child in list(base_sfx):
-            base_sfx.remove(child)
-
-        root.remove(base_sfx)
+        del base_sfx[:]
 
         return base_sfx, sfx_keyframe
 
-    def get_time_ranges_sec(self) -> List[Tuple[float, float, float]]:
+    def get_time_ranges_ticks(self) -> List[Tuple[int, int, int]]:
         if self.time_ranges:
             ranges = []
-            first: float
-            # Convert the time ranges from KKtime to seconds
+            first: int
+            # Convert the time ranges from KKtime to ticks
             for tg in self.time_ranges:
                 ranges.append(
                     [
-                        (first := convert_KKtime_to_seconds(tg[0])),
-                        convert_KKtime_to_seconds(tg[1]),
-                        convert_KKtime_to_seconds(tg[2]) if tg[2] else first,
+                        (first := convert_KKtime_to_ticks(tg[0])),
+                        convert_KKtime_to_ticks(tg[1]),
+                        convert_KKtime_to_ticks(tg[2]) if tg[2] else first,
                     ]
                 )
-            # Make sure the ranges are sorted and don't overlap
+            # Make sure the ranges are sorted and don't overlap. An overlapping range
+            # ends where the next one starts, so both sections share that keyframe
+            # like adjacent ranges do.
             ranges.sort(key=lambda x: x[0])
             for i in range(0, len(ranges) - 1):
                 if ranges[i][1] > ranges[i + 1][0]:
-                    ranges[i][1] = ranges[i + 1][0] - 0.00001
+                    ranges[i][1] = ranges[i + 1][0]
 
             return [
                 (ranges[i][0], ranges[i][1], ranges[i][2]) for i in range(0, len(ranges))
             ]
 
         else:
-            return [(0.0, math.inf, 0.0)]
+            return [(0, END_TICKS, 0)]
 
     def _round(self, value: float) -> float:
-        return round(value, 5)
-
-    def _truncate(self, value: float) -> float:
-        factor = 10.0**5
-        return int(value * factor) / factor
-
-    def _std_time(self, time: Union[str, int, float]) -> float:
-        return self._truncate(float(time))
-
-    def _clean_xml(self, xml: et.Element) -> None:
-        # Remove all formatting (strip whitespace and newlines)
-        for element in list(xml):
-            self._clean_xml(element)
-            if element.text:
-                element.text = element.text.strip()
-            if element.tail:
-                element.tail = element.tail.strip()
+        return round(value, self.ROUND_DIGITS)
 
     def _calculate_distance(
         self, reference_value: float, value: float, out_direction: float
@@ -744,54 +967,59 @@ class PlapGenerator:
         else:
             return self._round(abs(reference_value - value))
 
-    def _convert_to_plapframes(
-        self, keyframes: Sequence[et.Element], shared_axis: PlapAxis
-    ) -> List[PlapFrame]:
-        plapframes: List[PlapFrame] = []
-        for keyframe, next_keyframe in zip(keyframes, keyframes[1:]):
-            frame_left = PlapFrame(
-                keyframe_get(keyframe, "time"),
-                keyframe_get(keyframe, "valueX"),
-                keyframe_get(keyframe, "valueY"),
-                keyframe_get(keyframe, "valueZ"),
-                shared_axis,
-            )
-            frame_right = PlapFrame(
-                keyframe_get(next_keyframe, "time"),
-                keyframe_get(next_keyframe, "valueX"),
-                keyframe_get(next_keyframe, "valueY"),
-                keyframe_get(next_keyframe, "valueZ"),
-                shared_axis,
+    def sample_trajectory(
+        self, keyframes: "KeyframeTable", start: int = 0, stop: Optional[int] = None
+    ) -> "SampledTrajectory":
+        trajectory = SampledTrajectory()
+        stop = len(keyframes) if stop is None else min(stop, len(keyframes))
+        times = keyframes.time
+        values_x, values_y, values_z = (
+            keyframes.valueX,
+            keyframes.valueY,
+            keyframes.valueZ,
+        )
+        digits = self.ROUND_DIGITS
+        for i in range(start, stop - 1):
+            left_time, left_x, left_y, left_z = (
+                times[i],
+                values_x[i],
+                values_y[i],
+                values_z[i],
             )
-            plapframes.append(frame_left)
-
-            for c_time, c_value in zip(*evaluate_curve(list(keyframe))):
-                # print(
-                #     f"T: {c_time} V: {c_value} Left: {frame_left.time} Right: {frame_right.time} LV: {frame_left.valueY} RV: {frame_right.valueY}"
-                # )
-                # print(
-                #     frame_left.valueY + (frame_right.valueY - frame_left.valueY) * c_value
-                # )
-                plapframes.append(
-                    PlapFrame(
-                        self._round(
-                            frame_left.time
-                            + c_time * (frame_right.time - frame_left.time)
-                        ),
-                        self._round(
-                            frame_left.valueX
-                            + (frame_right.valueX - frame_left.valueX) * c_value
-                        ),
-                        self._round(
-                            frame_left.valueY
-                            + (frame_right.valueY - frame_left.valueY) * c_value
-                        ),
-                        self._round(
-                            frame_left.valueZ
-                            + (frame_right.valueZ - frame_left.valueZ) * c_value
-                        ),
-                        shared_axis,
-                    )
+            span = times[i + 1] - left_time
+            diff_x = values_x[i + 1] - left_x
+            diff_y = values_y[i + 1] - left_y
+            diff_z = values_z[i + 1] - left_z
+
+            trajectory.time.append(left_time)
+            trajectory.valueX.append(left_x)
+            trajectory.valueY.append(left_y)
+            trajectory.valueZ.append(left_z)
+
+            c_times, c_values = evaluate_curve_cached(keyframes.curve(i))
+            trajectory.time.extend([left_time + round(t * span) for t in c_times])
+            if keyframes.curve_kind[i] == CURVE_CONSTANT:
+                # One value per flat curve segment
+                levels = c_values[::CURVE_NUM_POINTS]
+                for axis_values, left, diff in (
+                    (trajectory.valueX, left_x, diff_x),
+                    (trajectory.valueY, left_y, diff_y),
+                    (trajectory.valueZ, left_z, diff_z),
+                ):
+                    for v in levels:
+                        axis_values.extend(
+                            [round(left + diff * v, digits)] * CURVE_NUM_POINTS
+                        )
+            else:
+                trajectory.valueX.extend(
+                    [round(left_x + diff_x * v, digits) for v in c_values]
+                )
+                trajectory.valueY.extend(
+                    [round(left_y + diff_y * v, digits) for v in c_values]
+                )
+                trajectory.valueZ.extend(
+                    [round(left_z + diff_z * v, digits) for v in c_values]
                 )
+            trajectory.offsets.append(len(trajectory.time))
 
-        return plapframes
+        return trajectory
@@ -0,0 +1,76 @@
+import functools
+import os
+from collections import Counter
+from typing import Dict, Iterable, Tuple
+from xml.etree import ElementTree as et
+
+from kk_plap_generator.generator.models import KeyframeTable
+from kk_plap_generator.generator.xml_node_finder import (
+    InterpolableIndex,
+    iterparse_interpolable,
+)
+
+
+class SingleFile:
+    """A parsed Timeline single file, with its interpolable index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.root = et.parse(path).getroot()
+
+    @functools.cached_property
+    def index(self) -> InterpolableIndex:
+        return InterpolableIndex(self.root)
+
+
+class SingleFileCache:
+    """
+    Reference keyframes of the single files used in one generation run.
+
+    Files used by several groups are parsed and indexed once, and the keyframe table
+    of each interpolable is built once and shared. A file used by a single group is
+    streamed instead, only its reference interpolable is loaded.
+    """
+
+    def __init__(self, paths: Iterable[str] = ()):
+        self.usages = Counter(self.resolve_path(path) for path in paths)
+        self.files: Dict[str, Tuple[Tuple[int, int], SingleFile]] = {}
+        self.tables: Dict[Tuple[str, Tuple[int, int], str], KeyframeTable] = {}
+        self.parsed_count = 0
+        self.streamed_count = 0
+
+    @staticmethod
+    def resolve_path(path: str) -> str:
+        return os.path.normcase(os.path.realpath(path))
+
+    def get_file(self, path: str) -> SingleFile:
+        """Parsed single file, parsed again only if it changed on disk."""
+        path = self.resolve_path(path)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self.files.get(path)
+        if cached is None or cached[0] != version:
+            cached = (version, SingleFile(path))
+            self.files[path] = cached
+            self.tables = {k: v for k, v in self.tables.items() if k[0] != path}
+            self.parsed_count += 1
+
+        return cached[1]
+
+    def get_keyframes(self, path: str, interpolable: str) -> KeyframeTable:
+        """Keyframes of the reference interpolable of a single file."""
+        resolved = self.resolve_path(path)
+        if self.usages[resolved] <= 1 and resolved not in self.files:
+            self.streamed_count += 1
+            return KeyframeTable.from_keyframes(
+                iterparse_interpolable(resolved, interpolable)
+            )
+
+        single_file = self.get_file(resolved)
+        key = (resolved, self.files[resolved][0], interpolable)
+        table = self.tables.get(key)
+        if table is None:
+            table = KeyframeTable.from_keyframes(single_file.index.find(interpolable))
+            self.tables[key] = table
+
+        return table
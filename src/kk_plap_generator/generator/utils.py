@@ -1,7 +1,13 @@
 import math
-from typing import Any, List, cast
+import os
+from typing import Any, Dict, List, Tuple, cast
 from xml.etree import ElementTree as et
 
+# Times are held as integer ticks of 10 µs, the precision of the Timeline files
+TICKS_PER_SECOND = 100_000
+# Time of the ranges going to the end of the timeline
+END_TICKS = 2**62
+
 
 class InfiniteIterator:
     def __init__(self, data):
@@ -29,8 +35,88 @@ def keyframe_get(keyframe: et.Element, key: str) -> float:
     return round(float(cast(str, keyframe.get(key))), 5)
 
 
+def keyframe_ticks(keyframe: et.Element, key: str = "time") -> int:
+    return to_ticks(float(cast(str, keyframe.get(key))))
+
+
+def to_ticks(seconds: float) -> int:
+    return round(seconds * TICKS_PER_SECOND)
+
+
+def ticks_to_seconds(ticks: int) -> float:
+    return ticks / TICKS_PER_SECOND
+
+
+def format_ticks(ticks: int) -> str:
+    """Exact decimal seconds of a time in ticks, without trailing zeros."""
+    seconds, fraction = divmod(abs(ticks), TICKS_PER_SECOND)
+    formatted = f"{'-' if ticks < 0 else ''}{seconds}"
+    if fraction:
+        formatted += f".{fraction:05d}".rstrip("0")
+    return formatted
+
+
+def format_number(value: float, digits: int = 5) -> str:
+    """Fixed precision decimal without trailing zeros, ``12.35`` instead of
+    ``12.350000000000001``."""
+    formatted = f"{value:.{digits}f}".rstrip("0").rstrip(".")
+    return "0" if formatted == "-0" else formatted
+
+
+def format_value(value: Any) -> str:
+    """Attribute value of a keyframe, floats with ``format_number``."""
+    return format_number(value) if isinstance(value, float) else str(value)
+
+
 def keyframe_set(keyframe: et.Element, key: str, value: Any):
-    keyframe.set(key, str(value))
+    keyframe.set(key, format_value(value))
+
+
+def copy_node(node: et.Element) -> et.Element:
+    """Shallow copy of a node, the children are shared and not copied."""
+    new_node = et.Element(node.tag, node.attrib)
+    new_node.text = node.text
+    new_node.tail = node.tail
+    new_node.extend(node)
+    return new_node
+
+
+def make_keyframe(template: et.Element, time: Any, value: Any) -> et.Element:
+    """New keyframe from a template keyframe, sharing the template's curve keyframes."""
+    keyframe = copy_node(template)
+    keyframe_set(keyframe, "time", time)
+    keyframe_set(keyframe, "value", value)
+    return keyframe
+
+
+def clean_xml(xml: et.Element) -> None:
+    # Remove all formatting (strip whitespace and newlines)
+    for element in list(xml):
+        clean_xml(element)
+        if element.text:
+            element.text = element.text.strip()
+        if element.tail:
+            element.tail = element.tail.strip()
+
+
+_TEMPLATE_CACHE: Dict[Tuple[str, int], et.Element] = {}
+
+
+def load_template(path: str) -> et.Element:
+    """
+    Parsed and cleaned root of a template file, cached for the whole process and
+    re-parsed only when the file changes. The root is shared, do not modify it.
+    """
+    path = os.path.abspath(path)
+    key = (path, os.stat(path).st_mtime_ns)
+    root = _TEMPLATE_CACHE.get(key)
+    if root is None:
+        root = et.parse(path).getroot()
+        clean_xml(root)
+        _TEMPLATE_CACHE.clear()
+        _TEMPLATE_CACHE[key] = root
+
+    return root
 
 
 def convert_string_to_nested_list(s: str):
@@ -56,6 +142,14 @@ def convert_KKtime_to_seconds(time_str: str) -> float:
         return int(minutes) * 60 + int(seconds) + float(f"0.{fraction}")
 
 
+def convert_KKtime_to_ticks(time_str: str) -> int:
+    """Convert a time string of format 'MM:SS.SS' to ticks, END is ``END_TICKS``"""
+    if time_str.upper() == "END":
+        return END_TICKS
+
+    return to_ticks(convert_KKtime_to_seconds(time_str))
+
+
 def convert_seconds_to_KKtime(secs: float) -> str:
     """Convert seconds to a time string of format 'MM:SS.SS'"""
     minutes = int(secs // 60)
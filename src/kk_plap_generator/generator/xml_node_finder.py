@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import IO, Dict, List, Optional, Tuple, Union
 from xml.etree import ElementTree as et
 
 from kk_plap_generator.generator.utils import convert_string_to_nested_list
@@ -37,6 +37,69 @@ class NodeNotFoundError(Exception):
         return s
 
 
+class InterpolableIndex:
+    """
+    Every interpolable of a Timeline tree, found in a single traversal.
+
+    Interpolables are indexed by alias and by their ``group.group.alias`` path, the
+    first one in document order wins. Build it once per scene and share it between
+    the groups looking up interpolables in it.
+    """
+
+    def __init__(self, root: et.Element):
+        self.by_alias: Dict[str, et.Element] = {}
+        self.by_path: Dict[str, et.Element] = {}
+        self.aliases: List[str] = []
+
+        # (node, dotted group path), the path is None once outside of the group chain
+        stack: List[Tuple[et.Element, Optional[str]]] = [
+            (child, "") for child in reversed(root)
+        ]
+        while stack:
+            node, path = stack.pop()
+            if node.tag == "interpolable":
+                alias = node.get("alias")
+                if alias:
+                    self.aliases.append(alias)
+                    self.by_alias.setdefault(alias, node)
+                    if path is not None:
+                        self.by_path.setdefault(path + alias, node)
+                continue
+
+            if node.tag == "interpolableGroup" and path is not None:
+                path = f"{path}{node.get('name', '')}."
+            else:
+                path = None
+            stack.extend((child, path) for child in reversed(node))
+
+        # Fallback of scenes holding a single chain of nodes down to an interpolable
+        self.single = NODE_NOT_FOUND
+        node = root
+        while len(node) == 1:
+            node = node[0]
+            if node.tag == "interpolable":
+                self.single = node
+                break
+
+    def find(self, alias: str) -> et.Element:
+        """Interpolable with the alias, or the only one of the scene, else raises."""
+        node = self.by_alias.get(alias, self.single) if alias else self.single
+        if node is NODE_NOT_FOUND:
+            raise NodeNotFoundError(
+                "interpolable", "alias", alias, suggestions=list(self.aliases)
+            )
+        return node
+
+    def find_path(self, path: str) -> et.Element:
+        """Interpolable at the dotted ``group.group.alias`` path, else raises."""
+        node = self.by_path.get(path, NODE_NOT_FOUND)
+        if node is NODE_NOT_FOUND:
+            raise NodeNotFoundError(
+                "interpolable", "alias", path, suggestions=list(self.by_path)
+            )
+        return node
+
+
 def deep_find_interpolable(node_list: List[et.Element], target: str) -> et.Element:
     for node in node_list:
         if node.tag == "interpolable" and node.get("alias") == target:
@@ -60,6 +123,70 @@ def deep_find_possible_matches(node_list: List[et.Element], target: str) -> List
     return matches
 
 
+def iterparse_interpolable(source: Union[str, IO[bytes]], target: str) -> et.Element:
+    """
+    Stream a Timeline single file and return the first interpolable with the alias
+    ``target``, parsing stops as soon as it is found.
+
+    Everything that isn't the target is dropped from the tree once parsed, so memory
+    is bounded by the size of the target instead of the whole scene. Like
+    ``PlapGenerator.generate_xml``, falls back to the only interpolable of the file
+    when there is no match and the file holds a single chain of nodes.
+
+    A path is opened and closed here, a file object is left open for the caller.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return iterparse_interpolable(f, target)
+
+    skipped_aliases: List[str] = []
+    # [node, children count] of the open nodes, interpolable content excluded
+    stack: List[list] = []
+    interpolable_depth = 0
+    single_chain = True
+    candidate = NODE_NOT_FOUND
+
+    for event, node in et.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if interpolable_depth:
+                interpolable_depth += 1
+                continue
+
+            if stack:
+                stack[-1][1] += 1
+                if stack[-1][1] > 1:
+                    single_chain = False
+                    candidate = NODE_NOT_FOUND
+                if node.tag == "interpolable":
+                    interpolable_depth = 1
+
+            stack.append([node, 0])
+            continue
+
+        if interpolable_depth > 1:
+            interpolable_depth -= 1
+            continue
+
+        stack.pop()
+        if interpolable_depth:
+            interpolable_depth = 0
+            alias = node.get("alias")
+            if target and alias == target:
+                return node
+            if alias:
+                skipped_aliases.append(alias)
+            if single_chain and candidate is NODE_NOT_FOUND:
+                candidate = node
+
+        if stack:
+            stack[-1][0].remove(node)
+
+    if single_chain and candidate is not NODE_NOT_FOUND:
+        return candidate
+
+    raise NodeNotFoundError("interpolable", "alias", target, suggestions=skipped_aliases)
+
+
 def find_interpolable(root: et.Element, target: str) -> et.Element:
     node: et.Element = root
     tag, value, child = convert_string_to_nested_list(target)
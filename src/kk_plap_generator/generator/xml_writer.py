@@ -0,0 +1,218 @@
+import hashlib
+import io
+import os
+import stat
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, Iterable, Mapping, Sequence, Union
+from xml.etree import ElementTree as et
+
+from kk_plap_generator.generator.models import InterpolableTable
+from kk_plap_generator.generator.utils import format_ticks
+
+WRITE_BUFFER_SIZE = 1 << 16
+WRITE_WORKERS = 4
+
+_ATTRIBUTE_ESCAPES = (
+    ("&", "&amp;"),
+    ("<", "&lt;"),
+    (">", "&gt;"),
+    ('"', "&quot;"),
+    ("\r", "&#13;"),
+    ("\n", "&#10;"),
+    ("\t", "&#09;"),
+)
+_TEXT_ESCAPES = _ATTRIBUTE_ESCAPES[:3]
+
+Interpolable = Union[et.Element, InterpolableTable]
+
+
+def _escape(value: str, escapes=_ATTRIBUTE_ESCAPES) -> str:
+    for char, entity in escapes:
+        if char in value:
+            value = value.replace(char, entity)
+    return value
+
+
+def write_interpolables(path: str, interpolables: Iterable[Interpolable]) -> bool:
+    """
+    Write interpolables under a ``<root>`` node, as ``ElementTree.write`` would
+    without XML declaration, streaming them to a buffered file. The keyframes of an
+    ``InterpolableTable`` are written straight from its columns, as the elements
+    ``utils.make_keyframe`` would make.
+
+    The output is streamed to a temporary file next to ``path`` while being hashed.
+    It replaces ``path`` atomically, with the mode of the file it replaces, unless
+    ``path`` already has the same content. Returns whether it was written.
+    """
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(
+        os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp"
+    )
+    try:
+        # Created with the default permissions (umask), unlike tempfile.mkstemp
+        with open(tmp_path, "xb", buffering=0) as raw:
+            hashing = _HashingWriter(raw, digest)
+            with io.TextIOWrapper(
+                io.BufferedWriter(hashing, WRITE_BUFFER_SIZE),
+                encoding="UTF-8",
+                errors="xmlcharrefreplace",
+            ) as f:
+                _write_root(f.write, interpolables)
+            size = hashing.size
+
+        if _has_content(path, size, digest.digest()):
+            os.unlink(tmp_path)
+            return False
+
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return True
+
+
+def write_outputs(
+    outputs: Mapping[str, Sequence[Interpolable]], max_workers: int = WRITE_WORKERS
+) -> Dict[str, bool]:
+    """Write each file of ``outputs`` in a thread pool, returns which were written."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        written = executor.map(write_interpolables, outputs, outputs.values())
+        return dict(zip(outputs, written))
+
+
+class _HashingWriter(io.RawIOBase):
+    """Raw binary writer hashing the bytes it writes to ``raw``."""
+
+    def __init__(self, raw: BinaryIO, digest: "hashlib._Hash"):
+        self.raw = raw
+        self.digest = digest
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        written = self.raw.write(data) or 0
+        self.digest.update(memoryview(data)[:written])
+        self.size += written
+        return written
+
+
+def _has_content(path: str, size: int, digest: bytes) -> bool:
+    try:
+        if os.path.getsize(path) != size:
+            return False
+        existing = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(WRITE_BUFFER_SIZE), b""):
+                existing.update(chunk)
+    except OSError:
+        return False
+
+    return existing.digest() == digest
+
+
+def serialize_interpolables(interpolables: Iterable[Interpolable]) -> str:
+    """Same output as ``write_interpolables``, as a string."""
+    buffer = io.StringIO()
+    _write_root(buffer.write, interpolables)
+    return buffer.getvalue()
+
+
+def _write_root(write: Callable[[str], int], interpolables: Iterable[Interpolable]):
+    write("<root>")
+    leaves: Dict[int, str] = {}
+    for interpolable in interpolables:
+        if isinstance(interpolable, InterpolableTable):
+            _write_table(write, interpolable, leaves)
+        else:
+            _write_node(write, interpolable, leaves)
+    write("</root>")
+
+
+def _write_table(
+    write: Callable[[str], int], table: InterpolableTable, leaves: Dict[int, str]
+):
+    node = table.node
+    if not len(table):
+        _write_node(write, node, leaves)
+        return
+
+    write(f"{_format_start(node)}>")
+    if node.text:
+        write(_escape(node.text, _TEXT_ESCAPES))
+    formats = [_keyframe_format(template, leaves) for template in table.templates]
+    for time, value, template in zip(table.time, table.value, table.template):
+        write(formats[template].format(format_ticks(time), _escape(value)))
+    write(f"</{node.tag}>")
+
+    if node.tail:
+        write(_escape(node.tail, _TEXT_ESCAPES))
+
+
+def _keyframe_format(template: et.Element, leaves: Dict[int, str]) -> str:
+    """
+    Serialized keyframe made from ``template`` by ``utils.make_keyframe``, as a format
+    string of its time and value.
+    """
+    keys = list(template.attrib)
+    keys.extend(key for key in ("time", "value") if key not in template.attrib)
+    attributes = "".join(
+        ' time="{0}"'
+        if key == "time"
+        else ' value="{1}"'
+        if key == "value"
+        else _format_braces(f' {key}="{_escape(template.attrib[key])}"')
+        for key in keys
+    )
+
+    body = io.StringIO()
+    if len(template) == 0 and not template.text:
+        body.write(" />")
+    else:
+        body.write(">")
+        if template.text:
+            body.write(_escape(template.text, _TEXT_ESCAPES))
+        for child in template:
+            _write_node(body.write, child, leaves)
+        body.write(f"</{template.tag}>")
+    if template.tail:
+        body.write(_escape(template.tail, _TEXT_ESCAPES))
+
+    return f"<{_format_braces(template.tag)}{attributes}{_format_braces(body.getvalue())}"
+
+
+def _format_braces(value: str) -> str:
+    return value.replace("{", "{{").replace("}", "}}")
+
+
+def _format_start(node: et.Element) -> str:
+    attributes = "".join(
+        f' {key}="{_escape(value)}"' for key, value in node.attrib.items()
+    )
+    return f"<{node.tag}{attributes}"
+
+
+def _write_node(write: Callable[[str], int], node: et.Element, leaves: Dict[int, str]):
+    if len(node) == 0 and not node.text:
+        leaf = leaves.get(id(node))
+        if leaf is None:
+            leaf = leaves[id(node)] = f"{_format_start(node)} />"
+        write(leaf)
+    else:
+        write(f"{_format_start(node)}>")
+        if node.text:
+            write(_escape(node.text, _TEXT_ESCAPES))
+        for child in node:
+            _write_node(write, child, leaves)
+        write(f"</{node.tag}>")
+
+    if node.tail:
+        write(_escape(node.tail, _TEXT_ESCAPES))
@@ -1,12 +1,14 @@
 import os
 import typing
-import xml.etree.ElementTree as et
 from typing import Dict, List, Tuple
 
 import toml
 
+from kk_plap_generator import settings
+from kk_plap_generator.generator.models import InterpolableTable
+from kk_plap_generator.generator.planner import make_plan
 from kk_plap_generator.generator.plap_generator import PlapGenerator
-from kk_plap_generator.generator.utils import keyframe_get
+from kk_plap_generator.generator.xml_writer import write_outputs
 from kk_plap_generator.models import (
     GroupConfig,
 )
@@ -25,7 +27,8 @@ def log_print(message: str, output: List[str]):
 
 
 def generate_plaps(groups: typing.List[GroupConfig]):
-    interpolables: Dict[str, Tuple[et.Element, str]] = {}
+    # Outputs of every group for each alias, with the group they come from
+    interpolables: Dict[str, List[Tuple[InterpolableTable, GroupConfig]]] = {}
     output: typing.List[str] = []
 
     names = {f"{sc.name}" for group in groups for sc in group.component_configs}
@@ -34,56 +37,76 @@ def generate_plaps(groups: typing.List[GroupConfig]):
         output,
     )
 
-    for group in groups:
-        plap_generator = PlapGenerator(
-            interpolable_path=group.ref_interpolable,
-            offset=group.offset,
-            min_pull_out=group.min_pull_out,
-            min_push_in=group.min_push_in,
-            time_ranges=group.time_ranges,
-            component_configs=group.component_configs,
-        )
-        xml_tree = et.ElementTree()
-        xml_tree.parse(group.ref_single_file)
-        results = plap_generator.generate_xml(xml_tree)
+    # Groups usually share their single file and sections, the plan runs them once
+    plan, emit_nodes = make_plan(groups)
+    if settings.IS_DEV:
+        print(plan)
+    plan.run()
+
+    for group, emit_node in zip(groups, emit_nodes):
+        results: List[PlapGenerator.GeneratorResult] = emit_node.result
         for result in results:
             for interpolable in result.interpolables:
-                alias = interpolable.get("alias", "")
-                if alias in interpolables:
-                    ref_time = keyframe_get(list(interpolables[alias][0])[-1], "time")
-                    index = next(
-                        (
-                            i
-                            for i, kf in enumerate(interpolable)
-                            if keyframe_get(kf, "time") > ref_time + 0.01
-                        ),
-                        -1,  # Default value if no match is found
-                    )
-                    if index == -1:
-                        log_print(
-                            f"Warning: No new keyframes found for {alias} in {group.ref_single_file}.",
-                            output,
-                        )
-
-                    interpolables[alias][0].extend(interpolable[index:])
-                    op_type = "Added"
-                else:
-                    interpolables[alias] = (interpolable, group.ref_single_file)
-                    op_type = "Generated"
+                alias = interpolable.alias or ""
+                op_type = "Added" if alias in interpolables else "Generated"
+                interpolables.setdefault(alias, []).append((interpolable, group))
+                removed = (
+                    f" ({result.removed_count} removed by decimation)"
+                    if result.removed_count
+                    else ""
+                )
+                log_print(
+                    f"{alias}:: {op_type} {result.keyframes_count} keyframes from {result.time_range[0]} to {result.time_range[1]}{removed}",
+                    output,
+                )
 
+    # Same alias outputs are merged by time, wherever they overlap
+    merged: Dict[str, Tuple[InterpolableTable, str]] = {}
+    for alias, sources in interpolables.items():
+        # The widest gap of the merged groups wins
+        interpolable, kept_counts = InterpolableTable.merge(
+            [source[0] for source in sources],
+            max(source[1].merge_min_gap for source in sources),
+        )
+        for (_, group), kept_count in zip(sources[1:], kept_counts[1:]):
+            if kept_count == 0:
                 log_print(
-                    f"{alias}:: {op_type} {result.keyframes_count} keyframes from {result.time_range[0]} to {result.time_range[1]}",
+                    f"Warning: No new keyframes found for {alias} in {group.ref_single_file}.",
                     output,
                 )
+        merged[alias] = (interpolable, sources[0][1].ref_single_file)
+
     log_print(
         "==================================================================", output
     )
 
-    for alias, (interpolable, ref_single_file_path) in interpolables.items():
-        tree = et.ElementTree(et.Element("root"))
-        tree.getroot().append(interpolable)
-        filename = os.path.join(os.path.dirname(ref_single_file_path), f"{alias}.xml")
-        tree.write(filename, method="xml", encoding="UTF-8", xml_declaration=False)
-        log_print(f"> Generated '{filename}'", output)
+    outputs = {
+        os.path.join(os.path.dirname(ref_single_file_path), f"{alias}.xml"): [
+            interpolable
+        ]
+        for alias, (interpolable, ref_single_file_path) in merged.items()
+    }
+    written = write_outputs(outputs)
+    for filename, is_written in written.items():
+        if is_written:
+            log_print(f"> Generated '{filename}'", output)
+        else:
+            log_print(f"> Unchanged '{filename}'", output)
+
+    written_count = sum(written.values())
+    log_print(
+        f"Written {written_count} files, skipped {len(written) - written_count} unchanged files.",
+        output,
+    )
+    if plan.stats["segments"]:
+        log_print(
+            f"Pruned {plan.stats['pruned_segments']} of {plan.stats['segments']} curve segments before sampling.",
+            output,
+        )
+    if plan.stats["dense_sections"]:
+        log_print(
+            f"Detected {plan.stats['dense_sections']} sections from dense keyframes without their curves.",
+            output,
+        )
 
     return output
@@ -1,6 +1,6 @@
 import math
 import tkinter as tk
-from tkinter import simpledialog, ttk
+from tkinter import messagebox, simpledialog, ttk
 from typing import (
     TYPE_CHECKING,
     List,
@@ -8,7 +8,9 @@ from typing import (
     Tuple,
 )
 
+from kk_plap_generator.generator.events import MUTE_LEAD
 from kk_plap_generator.generator.plap_generator import PlapGenerator
+from kk_plap_generator.generator.utils import ticks_to_seconds
 from kk_plap_generator.gui import info_text
 from kk_plap_generator.gui.info_message import InfoMessageFrame
 from kk_plap_generator.gui.widgets.base import PlapWidget
@@ -212,6 +214,8 @@ class ComponentConfigDialog(simpledialog.Dialog):
                 0, str(ac_config.cutoff) if ac_config.cutoff != math.inf else ""
             )
 
+            self.add_frame_tick_entry(ac_config, row=1)
+
         elif self.type_var.get() == MultiActivableComponentConfig.get_conf_type():
             mac_config = MultiActivableComponentConfig.from_toml_dict(
                 **self.component_config.to_toml_dict()
@@ -284,6 +288,8 @@ class ComponentConfigDialog(simpledialog.Dialog):
             # Table for MultiActivableComponentConfig
             self.mac_table = MACTable(self, self.extra_fields_frame, mac_config)
 
+            self.add_frame_tick_entry(mac_config, row=4)
+
         elif self.type_var.get() == PregPlusComponentConfig.get_conf_type():
             preg_config: PregPlusComponentConfig = PregPlusComponentConfig(
                 **self.component_config.to_toml_dict()
@@ -331,6 +337,27 @@ class ComponentConfigDialog(simpledialog.Dialog):
             )
             self.out_curve_selector.grid(row=3, column=1)
 
+            # Decimation of the output keyframes, disabled when the tolerance is empty
+            tk.Label(self.extra_fields_frame, text="Decimation Tolerance:").grid(
+                row=4, column=0
+            )
+            self.decimation_tolerance_entry = tk.Entry(self.extra_fields_frame)
+            self.decimation_tolerance_entry.grid(row=4, column=1)
+            if preg_config.decimate:
+                self.decimation_tolerance_entry.insert(
+                    0, str(preg_config.decimation_tolerance)
+                )
+
+    def add_frame_tick_entry(self, ac_config: ActivableComponentConfig, row: int):
+        # Snapping of the keyframe times, disabled when empty
+        tk.Label(self.extra_fields_frame, text="Frame Tick (sec):").grid(
+            row=row, column=0
+        )
+        self.frame_tick_entry = tk.Entry(self.extra_fields_frame)
+        self.frame_tick_entry.grid(row=row, column=1)
+        if ac_config.frame_tick > 0:
+            self.frame_tick_entry.insert(0, str(ac_config.frame_tick))
+
     def add_to_pattern_string(self, char, mac_config: MultiActivableComponentConfig):
         mac_config.pattern += char
         self.pattern_string_value.config(text=mac_config.pattern)
@@ -342,6 +369,26 @@ class ComponentConfigDialog(simpledialog.Dialog):
     def on_type_change(self, event):
         self.update_extra_fields()
 
+    def validate(self):
+        if self.type_var.get() in (
+            ActivableComponentConfig.get_conf_type(),
+            MultiActivableComponentConfig.get_conf_type(),
+        ):
+            # Snapping further than the mute lead would move the mutes over the plaps
+            max_frame_tick = ticks_to_seconds(MUTE_LEAD)
+            try:
+                frame_tick = float(self.frame_tick_entry.get() or 0.0)
+            except ValueError:
+                frame_tick = -1.0
+            if not 0.0 <= frame_tick <= max_frame_tick:
+                messagebox.showerror(
+                    "Validation Error",
+                    f"Invalid frame tick. Expected seconds from 0 to {max_frame_tick}.",
+                )
+                return False
+
+        return True
+
     def apply(self):
         if self.type_var.get() == ActivableComponentConfig.get_conf_type():
             self.component_config = ActivableComponentConfig(
@@ -351,6 +398,8 @@ class ComponentConfigDialog(simpledialog.Dialog):
                 self.component_config.cutoff = float(cutoff)
             if offset := self.offset_entry.get():
                 self.component_config.offset = float(offset)
+            if frame_tick := self.frame_tick_entry.get():
+                self.component_config.frame_tick = float(frame_tick)
 
         elif self.type_var.get() == MultiActivableComponentConfig.get_conf_type():
             self.component_config = MultiActivableComponentConfig(
@@ -361,6 +410,8 @@ class ComponentConfigDialog(simpledialog.Dialog):
                 self.component_config.cutoff = float(cutoff)
             if offset := self.offset_entry.get():
                 self.component_config.offset = float(offset)
+            if frame_tick := self.frame_tick_entry.get():
+                self.component_config.frame_tick = float(frame_tick)
 
             self.component_config.item_configs = []
             for i, (name_entry, offset_entry, cutoff_entry, _) in enumerate(
@@ -392,6 +443,9 @@ class ComponentConfigDialog(simpledialog.Dialog):
                 self.component_config.in_curve = in_curve
             if out_curve := self.out_curve_selector.get():
                 self.component_config.out_curve = out_curve
+            if decimation_tolerance := self.decimation_tolerance_entry.get():
+                self.component_config.decimate = True
+                self.component_config.decimation_tolerance = float(decimation_tolerance)
 
         self.is_cancelled = False
 
@@ -35,13 +35,18 @@ class ActivableComponentConfig(ComponentConfig):
         *,
         cutoff: float = math.inf,
         offset: float = 0.0,
+        frame_tick: float = 0.0,
         **kwargs,
     ):
         super().__init__(name=name, offset=offset, **kwargs)
         self.cutoff: float = cutoff
+        # Keyframe times are snapped to multiples of the tick (in sec), 0 to disable
+        self.frame_tick: float = frame_tick
 
     def to_toml_dict(self):
-        return dict(super().to_toml_dict(), cutoff=self.cutoff)
+        return dict(
+            super().to_toml_dict(), cutoff=self.cutoff, frame_tick=self.frame_tick
+        )
 
 
 class MultiActivableComponentConfig(ActivableComponentConfig):
@@ -53,24 +58,34 @@ class MultiActivableComponentConfig(ActivableComponentConfig):
         pattern: str = "V",
         cutoff: float = math.inf,
         offset: float = 0.0,
+        frame_tick: float = 0.0,
         **kwargs,
     ):
-        super().__init__(name=name, offset=offset, cutoff=cutoff, **kwargs)
+        super().__init__(
+            name=name, offset=offset, cutoff=cutoff, frame_tick=frame_tick, **kwargs
+        )
         self.pattern: str = pattern
         self.item_configs: List[ActivableComponentConfig] = item_configs
 
     def to_toml_dict(self):
         return dict(
             super().to_toml_dict(),
-            item_configs=[ic.to_toml_dict() for ic in self.item_configs],
+            item_configs=[
+                {k: v for k, v in ic.to_toml_dict().items() if k != "frame_tick"}
+                for ic in self.item_configs
+            ],
             pattern=self.pattern,
         )
 
     @classmethod
     def from_toml_dict(cls, **kwargs):
         return cls(
+            # The frame tick is a setting of the whole component, not of its items
             item_configs=[
-                ActivableComponentConfig(**ic) for ic in kwargs.pop("item_configs", [])
+                ActivableComponentConfig(
+                    **{k: v for k, v in ic.items() if k != "frame_tick"}
+                )
+                for ic in kwargs.pop("item_configs", [])
             ],
             **kwargs,
         )
@@ -86,6 +101,8 @@ class PregPlusComponentConfig(ComponentConfig):
         in_curve: str = get_curve_types()[0],
         out_curve: str = get_curve_types()[0],
         offset: float = 0.0,
+        decimate: bool = False,
+        decimation_tolerance: float = 0.5,
         **kwargs,
     ):
         super().__init__(name=name, offset=offset, **kwargs)
@@ -93,6 +110,10 @@ class PregPlusComponentConfig(ComponentConfig):
         self.max_value: int = max_value
         self.in_curve: str = in_curve
         self.out_curve: str = out_curve
+        # Remove the keyframes whose value is within the tolerance of the values
+        # interpolated between the kept ones
+        self.decimate: bool = decimate
+        self.decimation_tolerance: float = decimation_tolerance
 
     def to_toml_dict(self):
         return dict(
@@ -101,6 +122,8 @@ class PregPlusComponentConfig(ComponentConfig):
             max_value=self.max_value,
             in_curve=self.in_curve,
             out_curve=self.out_curve,
+            decimate=self.decimate,
+            decimation_tolerance=self.decimation_tolerance,
         )
 
 
@@ -132,6 +155,8 @@ class GroupConfig:
         min_pull_out: float = 0.2,
         min_push_in: float = 0.8,
         invert_direction: bool = False,
+        exact_crossings: bool = False,
+        merge_min_gap: float = 0.01,
     ):
         self.ref_interpolable: str = ref_interpolable
         self.ref_single_file: str = ref_single_file
@@ -152,6 +177,9 @@ class GroupConfig:
         self.min_pull_out: float = min_pull_out
         self.min_push_in: float = min_push_in
         self.invert_direction: bool = invert_direction
+        self.exact_crossings: bool = exact_crossings
+        # Keyframes of other groups closer than this (in seconds) are deduplicated
+        self.merge_min_gap: float = merge_min_gap
 
     def _deserialize_component(self, data: dict) -> ComponentConfig:
         component = STRING_TO_COMPONENT_CONFIG.get(data["type"])
@@ -171,6 +199,8 @@ class GroupConfig:
             "min_pull_out": self.min_pull_out,
             "min_push_in": self.min_push_in,
             "invert_direction": self.invert_direction,
+            "exact_crossings": self.exact_crossings,
+            "merge_min_gap": self.merge_min_gap,
         }
 
 
@@ -0,0 +1,199 @@
+from xml.etree import ElementTree as et
+
+import pytest
+
+from kk_plap_generator import settings
+from kk_plap_generator.generator.curve_ops import (
+    CURVE_CONSTANT,
+    CURVE_EMPTY,
+    CURVE_GENERAL,
+    CURVE_LINEAR,
+    CurveCache,
+    classify_curve,
+    clean_curve_keyframe,
+    convert_tangent_to_slope,
+    cubic_hermite_spline,
+    evaluate_cubic,
+    evaluate_curve_keyframes,
+    find_crossings,
+    hermite_bounds,
+    hermite_segments,
+    solve_cubic,
+)
+
+CURVES = {
+    "linear": [(0.0, 0.0, 0.0, 1.0), (1.0, 1.0, 1.0, 0.0)],
+    "ease_top": [(0.0, 0.0, 2.0, 2.0), (1.0, 1.0, 0.0, 0.0)],
+    "custom": [(0.0, 0.0, 0.0, 0.0), (0.5, 1.2, 10.0, -5.0), (1.0, 1.0, 0.0, 0.0)],
+}
+
+
+@pytest.mark.parametrize("name", CURVES.keys())
+@pytest.mark.parametrize("num_points", [1, 7, 200])
+def test_evaluate_curve_keyframes_matches_spline(name, num_points):
+    curve = CURVES[name]
+    times, values = evaluate_curve_keyframes(curve, num_points)
+
+    expected_times, expected_values = [], []
+    for (t0, p0, _, out_tangent), (t1, p1, in_tangent, _) in zip(curve, curve[1:]):
+        m0 = convert_tangent_to_slope(out_tangent)
+        m1 = convert_tangent_to_slope(in_tangent)
+        for j in range(num_points):
+            t = j / num_points
+            expected_times.append(t0 + t * (t1 - t0))
+            expected_values.append(cubic_hermite_spline(t, p0, p1, m0, m1))
+
+    assert list(times) == expected_times
+    assert list(values) == expected_values
+
+
+def test_evaluate_curve_keyframes_without_segment():
+    for curve in ([], [(0.0, 0.0, 0.0, 0.0)]):
+        times, values = evaluate_curve_keyframes(curve)
+        assert len(times) == len(values) == 0
+
+
+def test_curve_cache_shares_read_only_samples():
+    cache = CurveCache(maxsize=2)
+    curve = CURVES["ease_top"]
+
+    times, values = cache.get(curve)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert list(values) == list(evaluate_curve_keyframes(curve)[1])
+    with pytest.raises(TypeError):
+        values[0] = 1
+
+    assert cache.get(list(curve))[1] is values
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_curve_cache_evicts_least_recently_used():
+    cache = CurveCache(maxsize=2)
+    cache.get(CURVES["linear"])
+    cache.get(CURVES["ease_top"])
+    cache.get(CURVES["linear"])
+    cache.get(CURVES["custom"])
+
+    assert len(cache) == 2
+    cache.get(CURVES["linear"])
+    cache.get(CURVES["ease_top"])
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_curve_cache_prewarm_from_template():
+    cache = CurveCache()
+    cache.prewarm(et.parse(settings.TEMPLATE_FILE).getroot())
+    assert len(cache) > 0
+
+    cache.get(CURVES["ease_top"])
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+@pytest.mark.parametrize("name", CURVES.keys())
+def test_hermite_segments_match_spline(name):
+    curve = CURVES[name]
+    segments = hermite_segments(tuple(curve))
+
+    assert len(segments) == len(curve) - 1
+    for (t0, p0, _, out_tangent), (t1, p1, in_tangent, _), segment in zip(
+        curve, curve[1:], segments
+    ):
+        m0 = convert_tangent_to_slope(out_tangent)
+        m1 = convert_tangent_to_slope(in_tangent)
+        assert segment[:2] == (t0, t1)
+        for j in range(11):
+            assert evaluate_cubic(segment[2], j / 10) == pytest.approx(
+                cubic_hermite_spline(j / 10, p0, p1, m0, m1)
+            )
+
+
+def test_solve_cubic():
+    # (u - 0.2) * (u - 0.5) * (u - 0.9)
+    coefficients = (1.0, -1.6, 0.73, -0.09)
+    assert solve_cubic(coefficients, 0.0) == pytest.approx([0.2, 0.5, 0.9])
+    assert solve_cubic(coefficients, 1.0) == []
+    # Touches the target at the start and at its maximum
+    assert solve_cubic((0.0, -1.0, 1.0, 0.0), 0.0) == [0.0]
+    assert solve_cubic((0.0, -1.0, 1.0, 0.0), 0.25) == pytest.approx([0.5])
+
+
+def test_find_crossings():
+    curve = CURVES["custom"]
+    crossings = find_crossings(curve, [0.5, 1.1])
+    times, values = evaluate_curve_keyframes(curve, 2000)
+
+    # Segment starts and one crossing before each side change of the samples
+    assert [time for time, _ in crossings][:1] == [0.0]
+    assert 0.5 in [time for time, _ in crossings]
+    exact_times = [time for time, _ in crossings if time not in (0.0, 0.5)]
+    sampled_times = [
+        time
+        for time, value, prev in zip(times[1:], values[1:], values)
+        for target in (0.5, 1.1)
+        if (value < target) != (prev < target)
+    ]
+    assert len(exact_times) == len(sampled_times) == 3
+    for exact, sampled in zip(exact_times, sorted(sampled_times)):
+        assert 0.0 <= sampled - exact <= 1 / 2000
+
+
+@pytest.mark.parametrize("name", CURVES.keys())
+def test_hermite_bounds_contain_samples(name):
+    curve = CURVES[name]
+    low, high = hermite_bounds(tuple(curve))
+    _, values = evaluate_curve_keyframes(curve, 2000)
+
+    assert low <= min(values) and max(values) <= high
+    # Tight at the extrema of the curve
+    assert min(values) - low < 1e-6 and high - max(values) < 1e-3
+
+
+@pytest.mark.parametrize(
+    "curve, kind",
+    [
+        ([], CURVE_EMPTY),
+        ([(0.0, 0.5, 0.0, 0.0), (1.0, 0.5, 0.0, 0.0)], CURVE_CONSTANT),
+        ([(0.0, 0.0, 45.0, 45.0), (1.0, 1.0, 45.0, 45.0)], CURVE_LINEAR),
+        # Tangents are in degrees, a tangent of 1 isn't a line
+        (CURVES["linear"], CURVE_GENERAL),
+        (CURVES["custom"], CURVE_GENERAL),
+    ],
+)
+def test_classify_curve(curve, kind):
+    assert classify_curve(tuple(curve)) == kind
+
+
+@pytest.mark.parametrize(
+    "alias, kind",
+    [
+        ("SameAsReference", CURVE_EMPTY),
+        # Tangents are read as angles like everywhere else in the generator, so the
+        # template lines and stairs are cubics and stay on the general path
+        ("LinearCurve", CURVE_GENERAL),
+        ("StairsCurve", CURVE_GENERAL),
+        ("easeTopCurve", CURVE_GENERAL),
+        ("easeBottomCurve", CURVE_GENERAL),
+        ("HermiteCurve", CURVE_GENERAL),
+    ],
+)
+def test_classify_template_curves(alias, kind):
+    template = et.parse(settings.TEMPLATE_FILE).getroot()
+    keyframe = template.find(f"interpolable[@alias='Preg+']/keyframe[@alias='{alias}']")
+    assert keyframe is not None
+
+    assert classify_curve(tuple(clean_curve_keyframe(ckf) for ckf in keyframe)) == kind
+
+
+def test_classify_curve_keeps_evaluation():
+    # A fast path only changes how a curve is walked, never its values
+    for tangent in (1.0, 1.00001):
+        curve = ((0.0, 0.0, 0.0, tangent), (1.0, 1.0, tangent, 0.0))
+        _, values = evaluate_curve_keyframes(curve, 10)
+        assert list(values) == pytest.approx(
+            [
+                cubic_hermite_spline(
+                    j / 10, 0.0, 1.0, *[convert_tangent_to_slope(tangent)] * 2
+                )
+                for j in range(10)
+            ]
+        )
@@ -0,0 +1,269 @@
+import math
+import random
+from typing import List
+
+import pytest
+
+from kk_plap_generator import settings
+from kk_plap_generator.generator.curve_ops import evaluate_curve_at
+from kk_plap_generator.generator.events import (
+    DECIMATION_SAMPLES,
+    EVENT_CUTOFF,
+    EVENT_MUTE,
+    EVENT_ON,
+    EVENT_VALUES,
+    MUTE_LEAD,
+    assign_items,
+    compact_events,
+    decimate_keyframes,
+    make_activable_events,
+    make_preg_plus_events,
+)
+from kk_plap_generator.generator.models import EventTable, KeyframeReference
+from kk_plap_generator.generator.plap_generator import PlapGenerator
+
+
+@pytest.fixture(autouse=True)
+def no_dev_logs(monkeypatch):
+    monkeypatch.setattr(settings, "IS_DEV", False)
+
+
+def preg_plus_per_keyframe(generator, reference, times, values, min_value, max_value):
+    """Preg+ keyframes computed one keyframe at a time."""
+    is_plap = False
+    rows: List[tuple] = []
+    for i, (time, value) in enumerate(zip(times, values)):
+        distance = generator._calculate_distance(
+            reference.value, value, reference.out_direction
+        )
+        if distance > reference.estimated_pull_out:
+            preg_value = min_value
+            is_plap = False
+        else:
+            preg_value = int(
+                max(reference.estimated_pull_out - distance, 0.0)
+                / reference.estimated_pull_out
+                * max_value
+            )
+            preg_value = max(preg_value, min_value)
+            is_plap = generator.evaluate_is_plap(reference, value, is_plap)
+
+        time_actual = time + 12000
+        while rows and rows[-1][1] >= time_actual - 5000:
+            rows.pop()
+        rows.append((i, time_actual, preg_value, is_plap))
+        is_plap = not is_plap
+
+    return [list(column) for column in zip(*rows)] if rows else [[], [], [], []]
+
+
+def test_assign_items():
+    assert assign_items(5, [0, 1, 2, 1]) == [0, 1, 2, 1, 0]
+    assert assign_items(3, []) == []
+
+
+def test_make_activable_events():
+    events = make_activable_events(
+        [100000, 200000, 205000, 400000],
+        [0, 1, 1, 0],
+        offset=50000,
+        item_offsets=[0, 25000],
+        item_cutoffs=[30000, 0],
+        min_gap=10000,
+        mute_lead=5000,
+    )
+
+    assert events.items_count == 2
+    assert [events.time[r] for r in events.segment(0)] == [
+        145000, 150000, 180000, 445000, 450000, 480000
+    ]  # fmt: skip
+    assert [events.kind[r] for r in events.segment(0)] == [
+        EVENT_MUTE, EVENT_ON, EVENT_CUTOFF, EVENT_MUTE, EVENT_ON, EVENT_CUTOFF
+    ]  # fmt: skip
+    # The second plap of item 1 overlaps the first one, which is dropped
+    assert [events.time[r] for r in events.segment(1)] == [275000, 280000]
+    assert list(events.item) == [0] * 6 + [1] * 2
+
+
+@pytest.mark.parametrize(
+    "min_pull_out, min_push_in", [(0.2, 0.8), (0.0, 1.0), (1.0, 0.0)]
+)
+@pytest.mark.parametrize("out_direction", [1.0, -1.0])
+def test_make_preg_plus_events_matches_per_keyframe(
+    min_pull_out, min_push_in, out_direction
+):
+    rng = random.Random(7)
+    times = sorted(round(rng.uniform(0.0, 20.0) * 1000) * 100 for _ in range(300))
+    values = [round(rng.uniform(-1.5, 1.5), 4) for _ in range(300)]
+    generator = PlapGenerator(
+        "", [], [], offset=0.1, min_pull_out=min_pull_out, min_push_in=min_push_in
+    )
+    reference = KeyframeReference(
+        0.0, 0, axis="valueX", out_direction=out_direction, estimated_pull_out=1.0
+    )
+
+    events = make_preg_plus_events(
+        times,
+        values,
+        generator.make_detector(reference),
+        12000,
+        3,
+        45,
+        min_gap=5000,
+    )
+
+    assert [list(column) for column in events] == preg_plus_per_keyframe(
+        generator, reference, times, values, 3, 45
+    )
+
+
+def test_decimate_keyframes():
+    times = [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]
+    values = [0, 10, 20, 30, 30, 30, 31, 0]
+
+    # The ramp is linear and the plateau only keeps its ends
+    assert decimate_keyframes(times, values, 0.0) == [0, 3, 5, 6, 7]
+    assert decimate_keyframes(times, values, 1.5) == [0, 3, 6, 7]
+    assert decimate_keyframes(times, values, 100.0) == [0, 7]
+    assert decimate_keyframes(times[:2], values[:2], 0.0) == [0, 1]
+
+
+def displayed_values(times, values, curves, kept, at_times):
+    """Values displayed at ``at_times`` with the kept keyframes and their curves."""
+    displayed = []
+    for time in at_times:
+        k = max(k for k, i in enumerate(kept) if times[i] <= time)
+        if k == len(kept) - 1:
+            displayed.append(values[kept[k]])
+            continue
+        start, end = kept[k], kept[k + 1]
+        u = (time - times[start]) / (times[end] - times[start])
+        displayed.append(
+            values[start]
+            + (values[end] - values[start]) * evaluate_curve_at(curves[start], u)
+        )
+    return displayed
+
+
+@pytest.mark.parametrize("tolerance", [0.5, 2.0])
+def test_decimate_keyframes_with_curves(tolerance):
+    rng = random.Random(7)
+    ease_top = ((0.0, 0.0, 2.0, 2.0), (1.0, 1.0, 0.0, 0.0))
+    hermite = ((0.0, 0.0, 0.0, 0.0), (1.0, 1.0, 0.0, 0.0))
+    times = [i * 5000 for i in range(200)]
+    values = [int(45 * abs(math.sin(i / 6))) + rng.randrange(2) for i in range(200)]
+    curves = [rng.choice([ease_top, hermite]) for _ in times]
+
+    kept = decimate_keyframes(times, values, tolerance, curves)
+
+    assert len(kept) < len(times)
+    at_times = [
+        times[i] + (times[i + 1] - times[i]) * k / DECIMATION_SAMPLES
+        for i in range(len(times) - 1)
+        for k in range(DECIMATION_SAMPLES)
+    ]
+    full = displayed_values(times, values, curves, range(len(times)), at_times)
+    decimated = displayed_values(times, values, curves, kept, at_times)
+    assert max(abs(a - b) for a, b in zip(full, decimated)) <= tolerance
+    # Measured along straight lines, the error on the curves is larger
+    linear = decimate_keyframes(times, values, tolerance)
+    decimated = displayed_values(times, values, curves, linear, at_times)
+    assert max(abs(a - b) for a, b in zip(full, decimated)) > tolerance
+
+
+def state_at(events, item, time):
+    state = None
+    for row in events.segment(item):
+        if events.time[row] > time and state is not None:
+            break
+        state = EVENT_VALUES[events.kind[row]]
+    return state
+
+
+def test_compact_events_keeps_the_state():
+    rng = random.Random(3)
+    events = make_activable_events(
+        sorted(rng.randrange(3000000) for _ in range(200)),
+        [rng.randrange(2) for _ in range(200)],
+        offset=0,
+        item_offsets=[0, 3000],
+        item_cutoffs=[8000, 30000],
+        min_gap=10000,
+        mute_lead=5000,
+    )
+
+    compacted = compact_events(events)
+
+    assert len(compacted) < len(events)
+    for item in range(2):
+        times = [events.time[row] for row in events.segment(item)]
+        for time in times + [t + 100 for t in times]:
+            assert state_at(compacted, item, time) == state_at(events, item, time)
+
+
+def test_compact_events_frame_tick():
+    events = EventTable()
+    events.append_item(
+        [98000, 100000, 131000, 134000, 190000],
+        [EVENT_MUTE, EVENT_ON, EVENT_CUTOFF, EVENT_MUTE, EVENT_ON],
+    )
+
+    compacted = compact_events(events, frame_tick=5000)
+
+    assert list(compacted.time) == [95000, 100000, 130000, 190000]
+    assert list(compacted.kind) == [EVENT_MUTE, EVENT_ON, EVENT_CUTOFF, EVENT_ON]
+
+
+def test_compact_events_frame_tick_longer_than_mute_lead():
+    with pytest.raises(ValueError):
+        compact_events(EventTable(), frame_tick=MUTE_LEAD + 1)
+
+
+@pytest.mark.parametrize(
+    "plap_times, frame_tick",
+    [
+        ([100000, 120000, 140000, 160000], MUTE_LEAD),
+        ([500000 + 11000 * i for i in range(100)], 4000),
+        ([500000 + 11000 * i for i in range(100)], MUTE_LEAD),
+    ],
+)
+def test_compact_events_moves_by_one_tick_at_most(plap_times, frame_tick):
+    events = make_activable_events(
+        plap_times,
+        [0] * len(plap_times),
+        offset=0,
+        item_offsets=[0],
+        item_cutoffs=[3000],
+        min_gap=10000,
+        mute_lead=MUTE_LEAD,
+    )
+
+    compacted = compact_events(events, frame_tick)
+
+    ons = [t for t, kind in zip(compacted.time, compacted.kind) if kind == EVENT_ON]
+    assert len(ons) == len(plap_times)
+    for on, plap_time in zip(ons, plap_times):
+        assert abs(on - plap_time) <= frame_tick
+    for time in compacted.time:
+        assert min(abs(time - t) for t in events.time) <= 2 * frame_tick
+
+
+@pytest.mark.parametrize("frame_tick", [1000, 3333, MUTE_LEAD])
+def test_compact_events_coarse_frame_tick_keeps_retriggers(frame_tick):
+    plap_times = [100000 + 30000 * i for i in range(20)]
+    events = make_activable_events(
+        plap_times,
+        [0] * len(plap_times),
+        offset=0,
+        item_offsets=[0],
+        item_cutoffs=[0],
+        min_gap=10000,
+        mute_lead=5000,
+    )
+
+    compacted = compact_events(events, frame_tick)
+
+    # Every plap still turns the item off then on
+    values = [EVENT_VALUES[kind] for kind in compacted.kind]
+    assert values == ["false", "true"] * len(plap_times)
+    assert len(set(compacted.time)) == len(compacted)
@@ -0,0 +1,74 @@
+import copy
+
+import pytest
+
+from kk_plap_generator import settings
+from kk_plap_generator.generator.curve_ops import CURVE_NUM_POINTS
+from kk_plap_generator.generator.models import KeyframeTable
+from kk_plap_generator.generator.plap_generator import PlapGenerator
+from kk_plap_generator.tests.test_plap_generator import data_sets
+
+
+@pytest.fixture(autouse=True)
+def no_dev_logs(monkeypatch):
+    monkeypatch.setattr(settings, "IS_DEV", False)
+
+
+@pytest.fixture
+def keyframes_w_curves_sets():
+    return copy.deepcopy(data_sets.keyframes_w_curves_sets)
+
+
+def test_from_keyframes(keyframes_w_curves_sets):
+    interpolable = keyframes_w_curves_sets["simple"]
+    table = KeyframeTable.from_keyframes(interpolable)
+
+    assert len(table) == 5
+    assert list(table.time) == [0, 20000, 40000, 60000, 80000]
+    assert list(table.valueY) == [0.2, 0.1, 0.2, 0.1, 0.2]
+    assert table.axis("valueY") is table.valueY
+    assert table.nodes == list(interpolable)
+    assert table.curve(0) == [
+        (0.0, 0.0, 0.0, 0.0),
+        (0.5, 1.0, 0.0, 0.0),
+        (0.8, 0.0, 0.0, 0.0),
+    ]
+
+
+def test_take(keyframes_w_curves_sets):
+    table = KeyframeTable.from_keyframes(keyframes_w_curves_sets["under_push"])
+    taken = table.take([0, 0, 3])
+
+    assert list(taken.time) == [0, 0, 60000]
+    assert taken.nodes == [table.nodes[0], table.nodes[0], table.nodes[3]]
+    assert taken.curve(-1) == table.curve(3)
+    assert list(taken.curve_offsets) == [0, 3, 6, 9]
+
+
+def test_invalid_axis(keyframes_w_curves_sets):
+    table = KeyframeTable.from_keyframes(keyframes_w_curves_sets["simple"])
+    with pytest.raises(ValueError):
+        table.axis("valueW")
+
+
+def test_sample_trajectory(keyframes_w_curves_sets):
+    generator = PlapGenerator("", [("00:00.00", "END", "00:00.00")], [])
+    table = KeyframeTable.from_keyframes(keyframes_w_curves_sets["simple"])
+    trajectory = generator.sample_trajectory(table)
+
+    assert trajectory.segments_count == len(table) - 1
+    # Three curve keyframes per keyframe, so two curve segments of samples each
+    assert len(trajectory) == trajectory.segments_count * (2 * CURVE_NUM_POINTS + 1)
+    for i in range(trajectory.segments_count):
+        first = trajectory.segment(i)[0]
+        assert trajectory.time[first] == table.time[i]
+        assert trajectory.valueY[first] == table.valueY[i]
+
+
+def test_sections_share_trajectory(keyframes_w_curves_sets):
+    generator = PlapGenerator("", [("00:00.00", "END", "00:00.00")], [])
+    section = generator.make_sections(keyframes_w_curves_sets["simple"])[0]
+
+    assert generator.get_plaps_from_trajectory(
+        section.reference, section.trajectory
+    ) == generator.get_plaps_from_keyframes(section.reference, section.keyframes.nodes)
@@ -0,0 +1,65 @@
+import copy
+
+import pytest
+
+from kk_plap_generator import settings
+from kk_plap_generator.generator.plap_generator import PlapGenerator
+from kk_plap_generator.tests.test_plap_generator import data_sets
+
+
+@pytest.fixture(autouse=True)
+def no_dev_logs(monkeypatch):
+    monkeypatch.setattr(settings, "IS_DEV", False)
+
+
+@pytest.fixture
+def keyframes_w_curves_sets():
+    return copy.deepcopy(data_sets.keyframes_w_curves_sets)
+
+
+@pytest.mark.parametrize(
+    "time_ranges, expected_times",
+    [
+        ([("00:00.00", "END", "00:00.00")], [[0, 0, 20000, 40000, 60000, 80000]]),
+        ([("00:00.20", "00:00.60", "00:00.20")], [[0, 20000, 40000, 60000]]),
+        ([("00:00.30", "END", "00:00.20")], [[20000, 40000, 60000, 80000]]),
+        (
+            [("00:00.40", "END", "00:00.40"), ("00:00.00", "00:00.60", "00:00.00")],
+            [[0, 0, 20000, 40000], [20000, 40000, 60000, 80000]],
+        ),
+        ([("00:01.00", "END", "00:00.20")], []),
+    ],
+)
+def test_make_sections_time_ranges(keyframes_w_curves_sets, time_ranges, expected_times):
+    generator = PlapGenerator("", time_ranges, [])
+    sections = generator.make_sections(keyframes_w_curves_sets["simple"])
+
+    assert [list(section.keyframes.time) for section in sections] == expected_times
+
+
+def test_time_ranges_overlap_ends_at_next_start():
+    generator = PlapGenerator(
+        "", [("00:00.40", "END", "00:00.40"), ("00:00.00", "00:00.60", "00:00.00")], []
+    )
+
+    assert generator.get_time_ranges_ticks()[0] == (0, 40000, 0)
+
+
+def test_make_sections_reference(keyframes_w_curves_sets):
+    generator = PlapGenerator("", [("00:00.40", "END", "00:00.60")], [])
+    section = generator.make_sections(keyframes_w_curves_sets["simple"])[0]
+
+    assert section.reference.axis == "valueY"
+    assert 40000 <= section.reference.time <= 60000
+
+
+def test_make_sections_unsorted_keyframes(keyframes_w_curves_sets):
+    interpolable = keyframes_w_curves_sets["simple"]
+    keyframes = list(interpolable)
+    for keyframe in keyframes:
+        interpolable.remove(keyframe)
+    interpolable.extend(reversed(keyframes))
+
+    generator = PlapGenerator("", [("00:00.00", "END", "00:00.00")], [])
+    sections = generator.make_sections(interpolable)
+    assert list(sections[0].keyframes.time) == [0, 0, 20000, 40000, 60000, 80000]
@@ -0,0 +1,63 @@
+from xml.etree import ElementTree as et
+
+from kk_plap_generator.generator.models import (
+    InterpolableTable,
+    KeyframeReference,
+    KeyframeTable,
+)
+from kk_plap_generator.models import GroupConfig, MultiActivableComponentConfig
+
+
+def test_keyframe_reference_axis_index():
+    reference = KeyframeReference(
+        0.1, 0, axis="valueY", out_direction=1.0, estimated_pull_out=0.1
+    )
+    table = KeyframeTable()
+
+    assert reference.axis == "valueY"
+    assert table.axis(reference.axis_index) is table.axis("valueY") is table.valueY
+
+
+def test_multi_activable_frame_tick_is_top_level():
+    config = MultiActivableComponentConfig.from_toml_dict(
+        name="MAC",
+        frame_tick=0.05,
+        item_configs=[{"name": "MAC-1", "frame_tick": 0.1}, {"name": "MAC-2"}],
+    )
+    data = config.to_toml_dict()
+
+    assert data["frame_tick"] == 0.05
+    assert all("frame_tick" not in item for item in data["item_configs"])
+    assert config.copy().frame_tick == 0.05
+
+
+def test_group_merge_min_gap_round_trip():
+    assert GroupConfig().merge_min_gap == 0.01
+
+    data = GroupConfig(merge_min_gap=0.1).to_toml_dict()
+
+    assert data["merge_min_gap"] == 0.1
+    assert GroupConfig(**data).merge_min_gap == 0.1
+
+
+def make_table(*times):
+    table = InterpolableTable(
+        et.Element("interpolable", alias="Solo"), [et.Element("keyframe")]
+    )
+    for time in times:
+        table.append(time, "true")
+    return table
+
+
+def test_merge_interpolable_tables_by_time():
+    first = make_table(0, 50000, 100000, 300000)
+    second = make_table(20000, 100500, 200000, 200000)
+    third = make_table(50000)
+
+    merged, kept_counts = InterpolableTable.merge([first, second, third], 0.01)
+
+    assert merged.node is first.node
+    assert list(merged.time) == [0, 20000, 50000, 100000, 200000, 200000, 300000]
+    assert list(merged.template) == [0, 1, 0, 0, 1, 1, 0]
+    assert len(merged.templates) == 3
+    assert kept_counts == [4, 3, 0]
@@ -0,0 +1,86 @@
+import copy
+from xml.etree import ElementTree as et
+
+import pytest
+
+from kk_plap_generator import settings
+from kk_plap_generator.generator.planner import make_plan
+from kk_plap_generator.models import GroupConfig
+from kk_plap_generator.tests.test_plap_generator import data_sets
+
+
+@pytest.fixture(autouse=True)
+def no_dev_logs(monkeypatch):
+    monkeypatch.setattr(settings, "IS_DEV", False)
+
+
+@pytest.fixture
+def single_file(tmp_path):
+    interpolable = copy.deepcopy(data_sets.keyframes_w_curves_sets["simple"])
+    interpolable.set("alias", "ref")
+    root = et.Element("root")
+    root.append(interpolable)
+    path = str(tmp_path / "scene.xml")
+    et.ElementTree(root).write(path)
+    return path
+
+
+def make_group(path, component, **kwargs):
+    return GroupConfig(
+        ref_interpolable="ref",
+        ref_single_file=path,
+        component_configs=[component],
+        **kwargs,
+    )
+
+
+def test_plan_shares_identical_steps(single_file):
+    groups = [
+        make_group(single_file, {"name": "Solo", "type": "ActivableComponentConfig"}),
+        make_group(single_file, {"name": "Preg+", "type": "PregPlusComponentConfig"}),
+        make_group(
+            single_file,
+            {"name": "Other", "type": "ActivableComponentConfig"},
+            min_pull_out=0.5,
+            offset=0.1,
+        ),
+    ]
+
+    plan, emit_nodes = make_plan(groups)
+    kinds = [node.kind for node in plan.nodes.values()]
+
+    assert kinds.count("load") == 0  # Only one interpolable used, it is streamed
+    assert kinds.count("keyframes") == kinds.count("sections") == 1
+    assert kinds.count("detect") == 2
+    assert kinds.count("emit") == 3
+    assert "(shared by 3)" in plan.format()
+
+    plan.run()
+    aliases = [
+        [
+            interpolable.alias
+            for result in node.result
+            for interpolable in result.interpolables
+        ]
+        for node in emit_nodes
+    ]
+    assert aliases == [["Solo"], ["Preg+"], ["Other"]]
+
+
+def test_plan_loads_shared_file_once(single_file):
+    root = et.parse(single_file).getroot()
+    other = copy.deepcopy(root[0])
+    other.set("alias", "other")
+    root.append(other)
+    et.ElementTree(root).write(single_file)
+    groups = [
+        GroupConfig(ref_interpolable=alias, ref_single_file=single_file)
+        for alias in ("ref", "other", "ref")
+    ]
+
+    plan, _ = make_plan(groups)
+    kinds = [node.kind for node in plan.nodes.values()]
+
+    assert kinds[:2] == ["load", "index"]
+    assert kinds.count("load") == kinds.count("index") == 1
+    assert kinds.count("keyframes") == 2
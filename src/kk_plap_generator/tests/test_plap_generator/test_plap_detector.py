@@ -0,0 +1,339 @@
+import copy
+import math
+import random
+from array import array
+from collections import Counter
+from typing import List
+from xml.etree import ElementTree as et
+
+import pytest
+
+from kk_plap_generator import settings
+from kk_plap_generator.generator.curve_ops import CURVE_CONSTANT, CURVE_LINEAR
+from kk_plap_generator.generator.models import KeyframeReference, Section
+from kk_plap_generator.generator.plap_detector import (
+    PlapDetector,
+    local_extrema,
+    monotonic_flag_changes,
+)
+from kk_plap_generator.generator.plap_generator import PlapGenerator
+from kk_plap_generator.tests.test_plap_generator import data_sets
+
+MIN_PULL_PUSH = [(0.2, 0.8), (0.0, 1.0), (1.0, 0.0001), (0.5, 0.5), (0.0, 0.5)]
+
+
+@pytest.fixture(autouse=True)
+def no_dev_logs(monkeypatch):
+    monkeypatch.setattr(settings, "IS_DEV", False)
+
+
+def detect_per_sample(
+    generator: PlapGenerator,
+    reference: KeyframeReference,
+    times: List[int],
+    values: List[float],
+) -> List[int]:
+    keyframe_times: List[int] = []
+    did_plap = False
+    for time, value in zip(times, values):
+        will_plap = generator.evaluate_is_plap(reference, value, did_plap)
+        if did_plap and not will_plap:
+            did_plap = False
+        elif not did_plap and will_plap:
+            keyframe_times.append(time)
+            did_plap = True
+
+    return keyframe_times
+
+
+@pytest.mark.parametrize("min_pull_out, min_push_in", MIN_PULL_PUSH)
+@pytest.mark.parametrize(
+    "interpolable",
+    [
+        *data_sets.keyframes_sets.values(),
+        *data_sets.keyframes_w_curves_sets.values(),
+    ],
+)
+def test_same_times_as_evaluate_is_plap(min_pull_out, min_push_in, interpolable):
+    generator = PlapGenerator(
+        "",
+        [("00:00.00", "00:10.00", "00:00.00")],
+        [],
+        min_pull_out=min_pull_out,
+        min_push_in=min_push_in,
+    )
+    section = generator.make_sections(copy.deepcopy(interpolable))[0]
+    trajectory = section.trajectory
+    values = list(trajectory.axis(section.reference.axis))
+
+    assert generator.get_plaps_from_trajectory(
+        section.reference, trajectory
+    ) == detect_per_sample(generator, section.reference, list(trajectory.time), values)
+
+
+@pytest.mark.parametrize("min_pull_out, min_push_in", MIN_PULL_PUSH)
+@pytest.mark.parametrize("out_direction", [1.0, -1.0])
+def test_random_values(min_pull_out, min_push_in, out_direction):
+    rnd = random.Random(f"{min_pull_out}{min_push_in}{out_direction}")
+    generator = PlapGenerator(
+        "", [], [], min_pull_out=min_pull_out, min_push_in=min_push_in
+    )
+    reference = KeyframeReference(
+        0.1, 0, axis="valueY", out_direction=out_direction, estimated_pull_out=0.5
+    )
+    times = [i * 1000 for i in range(2000)]
+    values = [round(0.1 + out_direction * rnd.uniform(-0.1, 0.6), 5) for _ in times]
+
+    detector = PlapDetector(reference, min_pull_out, min_push_in)
+    assert detector.detect(times, values) == detect_per_sample(
+        generator, reference, times, values
+    )
+
+
+@pytest.mark.parametrize("min_pull_out, min_push_in", [(0.2, 0.8), (0.5, 0.5)])
+@pytest.mark.parametrize(
+    "interpolable",
+    [
+        *data_sets.keyframes_sets.values(),
+        *data_sets.keyframes_w_curves_sets.values(),
+    ],
+)
+def test_exact_crossings_match_samples(min_pull_out, min_push_in, interpolable):
+    generator = PlapGenerator(
+        "",
+        [("00:00.00", "00:10.00", "00:00.00")],
+        [],
+        min_pull_out=min_pull_out,
+        min_push_in=min_push_in,
+    )
+    sections = generator.make_sections(copy.deepcopy(interpolable))
+    sampled = generator.get_plap_times(sections)
+    generator.exact_crossings = True
+    exact = generator.get_plap_times(sections)
+
+    # Same plaps, found at most one sample earlier
+    times = sections[0].trajectory.time
+    step = max(b - a for a, b in zip(times, times[1:]))
+    assert len(exact) == len(sampled)
+    for e, s in zip(exact, sampled):
+        assert 0 <= s - e <= step
+
+
+def test_exact_crossings_between_samples():
+    # The curves get back to the reference at 0.8 of their keyframe, after the last
+    # sample. Without pull out threshold that's a plap the samples miss.
+    generator = PlapGenerator(
+        "",
+        [("00:00.00", "00:10.00", "00:00.00")],
+        [],
+        min_pull_out=0.0,
+        min_push_in=1.0,
+        exact_crossings=True,
+    )
+    sections = generator.make_sections(
+        copy.deepcopy(data_sets.keyframes_w_curves_sets["simple"])
+    )
+
+    assert any(15900 < time <= 16000 for time in generator.get_plap_times(sections))
+
+
+@pytest.mark.parametrize("min_pull_out, min_push_in", MIN_PULL_PUSH)
+@pytest.mark.parametrize(
+    "interpolable",
+    [
+        *data_sets.keyframes_sets.values(),
+        *data_sets.keyframes_w_curves_sets.values(),
+    ],
+)
+def test_pruned_segments_same_times(min_pull_out, min_push_in, interpolable):
+    generator = PlapGenerator(
+        "",
+        [("00:00.00", "00:10.00", "00:00.00")],
+        [],
+        min_pull_out=min_pull_out,
+        min_push_in=min_push_in,
+    )
+    section = generator.make_sections(copy.deepcopy(interpolable))[0]
+    stats: Counter = Counter()
+
+    assert generator.get_plaps_from_segments(
+        section.reference, section.keyframes, stats
+    ) == generator.get_plaps_from_trajectory(section.reference, section.trajectory)
+    assert 0 <= stats["pruned_segments"] <= stats["segments"]
+
+
+def test_pruned_segments_far_from_reference():
+    generator = PlapGenerator("", [("00:00.00", "END", "00:00.00")], [])
+    interpolable = copy.deepcopy(data_sets.keyframes_w_curves_sets["simple"])
+    section = generator.make_sections(interpolable)[0]
+    # Values 0.1, 0.1, 0.1 and 0.2, the first two segments stay pulled out
+    keyframes = section.keyframes.take([2, 4, 2, 3])
+    keyframes.time = array("q", [0, 20000, 40000, 60000])
+    stats: Counter = Counter()
+    times = generator.get_plaps_from_segments(section.reference, keyframes, stats)
+
+    assert (stats["segments"], stats["pruned_segments"]) == (3, 2)
+    assert times == generator.get_plaps_from_keyframes(section.reference, keyframes)
+
+
+@pytest.mark.parametrize("min_pull_out, min_push_in", MIN_PULL_PUSH)
+@pytest.mark.parametrize(
+    "curve, kind",
+    [
+        ([(0.0, 0.0, 0.0, 0.0), (1.0, 0.0, 0.0, 0.0)], CURVE_CONSTANT),
+        ([(0.0, 0.3, 0.0, 0.0), (1.0, 0.3, 0.0, 0.0)], CURVE_CONSTANT),
+        ([(0.0, 0.0, 45.0, 45.0), (1.0, 1.0, 45.0, 45.0)], CURVE_LINEAR),
+        # Up and back down, tangents of atan(0.5) in degrees
+        (
+            [
+                (0.0, 0.0, 26.56505117707799, 26.56505117707799),
+                (0.5, 0.5, 26.56505117707799, -26.56505117707799),
+                (1.0, 0.0, -26.56505117707799, -26.56505117707799),
+            ],
+            CURVE_LINEAR,
+        ),
+    ],
+)
+def test_shape_fast_paths_same_times(min_pull_out, min_push_in, curve, kind):
+    generator = PlapGenerator(
+        "",
+        [("00:00.00", "00:10.00", "00:00.00")],
+        [],
+        min_pull_out=min_pull_out,
+        min_push_in=min_push_in,
+    )
+    interpolable = copy.deepcopy(data_sets.keyframes_sets["simple"])
+    for keyframe in interpolable:
+        keyframe.extend(
+            et.Element(
+                "curve",
+                time=str(c_time),
+                value=str(c_value),
+                inTangent=str(c_in_tangent),
+                outTangent=str(c_out_tangent),
+            )
+            for c_time, c_value, c_in_tangent, c_out_tangent in curve
+        )
+    section = generator.make_sections(interpolable)[0]
+
+    assert set(section.keyframes.curve_kind) == {kind}
+    assert generator.get_plaps_from_segments(
+        section.reference, section.keyframes
+    ) == generator.get_plaps_from_trajectory(section.reference, section.trajectory)
+
+
+@pytest.mark.parametrize(
+    "values, extrema",
+    [
+        ([], []),
+        ([0.5], [0]),
+        ([0.1, 0.2, 0.3], [0, 2]),
+        ([0.1, 0.3, 0.3, 0.2, 0.2, 0.4], [0, 2, 4, 5]),
+        ([0.2, 0.2, 0.1, 0.3], [0, 2, 3]),
+    ],
+)
+def test_local_extrema(values, extrema):
+    assert local_extrema(values) == extrema
+
+
+def test_monotonic_flag_changes():
+    flags = [0, 0, 1, 1, 1, 3, 3, 2, 2]
+
+    assert monotonic_flag_changes(flags.__getitem__, 0, len(flags)) == [0, 2, 5, 6, 7]
+    assert monotonic_flag_changes(flags.__getitem__, 3, 6) == [3, 5]
+
+
+@pytest.mark.parametrize("min_pull_out, min_push_in", MIN_PULL_PUSH)
+def test_dense_keyframes_same_times(min_pull_out, min_push_in):
+    generator = PlapGenerator(
+        "",
+        [("00:00.00", "END", "00:00.00")],
+        [],
+        min_pull_out=min_pull_out,
+        min_push_in=min_push_in,
+    )
+    section = generator.make_sections(copy.deepcopy(data_sets.keyframes_sets["simple"]))[
+        0
+    ]
+    rng = random.Random(5)
+    # A keyframe every frame at 60 fps, going back and forth around the reference
+    keyframes = section.keyframes.take([0] * 600)
+    keyframes.time = array("q", [round(i * 100000 / 60) for i in range(600)])
+    keyframes.valueY = array(
+        "d",
+        [
+            round(0.15 + 0.06 * math.sin(i / 7) + rng.uniform(-0.01, 0.01), 5)
+            for i in range(600)
+        ],
+    )
+    stats: Counter = Counter()
+    times = generator.get_plap_times(
+        [Section(section.reference, keyframes, generator.sample_trajectory)], stats
+    )
+
+    assert generator.is_dense(keyframes)
+    assert stats["dense_sections"] == 1
+    assert times == generator.make_detector(section.reference).detect(
+        keyframes.time, keyframes.valueY
+    )
+    assert not PlapGenerator(
+        "", [("00:00.00", "END", "00:00.00")], [], dense_spacing=0.0
+    ).is_dense(keyframes)
+
+
+@pytest.mark.parametrize(
+    "set_name, expected_times, expected_did_plap",
+    [
+        ("basic_2frames", [14300], True),
+        ("one_plap_no_reset", [7150], True),
+        ("one_plap_w_reset", [7150], False),
+        ("multi_plap_w_reset", [3575, 13575], False),
+        ("multi_plap_over_pull", [3575, 14025], False),
+    ],
+)
+def test_curve_keyframe_plap_ticks(set_name, expected_times, expected_did_plap):
+    generator = PlapGenerator("", [("00:00.00", "END", "00:00.00")], [])
+    # Pushed in at Y: 0.1 at 0.2s, coming from Y: 0.2 at 0.0s. A plap is found on the
+    # first sample reaching min_push_in, e.g. 0.8 of a 0 to 1 ease at 0.715 of its length.
+    reference = KeyframeReference(
+        0.1, 20000, axis="valueY", out_direction=1.0, estimated_pull_out=0.1
+    )
+    did_plap, keyframe_times = generator.get_plaps_from_curve_keyframes(
+        reference,
+        list(copy.deepcopy(data_sets.curve_keyframe_simple_sets[set_name])),
+        curve_reference=data_sets.keyframes_sets["simple"][0],
+    )
+
+    assert did_plap == expected_did_plap
+    assert keyframe_times == expected_times
+    assert all(isinstance(time, int) for time in keyframe_times)
+
+
+def test_dense_keyframes_pull_out_from_values():
+    # A keyframe every frame at 60 fps, with curves overshooting the pulled out value
+    interpolable = et.Element("interpolable")
+    for i in range(60):
+        keyframe = et.Element(
+            "keyframe",
+            time=str(round(i / 60, 5)),
+            valueX="0",
+            valueY="0.1" if i % 2 else "0.2",
+            valueZ="0",
+        )
+        keyframe.extend(
+            copy.deepcopy(data_sets.curve_keyframe_simple_sets["multi_plap_over_push"])
+        )
+        interpolable.append(keyframe)
+
+    time_ranges = [("00:00.00", "END", "00:00.01")]
+    reference = (
+        PlapGenerator("", time_ranges, []).make_sections(interpolable)[0].reference
+    )
+    curve_reference = (
+        PlapGenerator("", time_ranges, [], dense_spacing=0.0)
+        .make_sections(interpolable)[0]
+        .reference
+    )
+
+    assert reference.estimated_pull_out == 0.1
+    assert curve_reference.estimated_pull_out > 0.1
@@ -0,0 +1,49 @@
+import os
+
+from kk_plap_generator.generator.single_file import SingleFileCache
+
+SCENE = """<root>
+  <interpolable alias="pelvis"><keyframe time="0" valueX="0" valueY="1" valueZ="2" />
+  <keyframe time="1" valueX="3" valueY="4" valueZ="5" /></interpolable>
+  <interpolable alias="other"><keyframe time="0" valueX="0" valueY="0" valueZ="0" /></interpolable>
+</root>"""
+
+
+def write_scene(path):
+    with open(path, "w", encoding="UTF-8") as f:
+        f.write(SCENE)
+
+
+def test_shared_single_file_is_parsed_once(tmp_path):
+    path = str(tmp_path / "scene.xml")
+    write_scene(path)
+    cache = SingleFileCache([path, os.path.join(str(tmp_path), ".", "scene.xml")])
+
+    keyframes = cache.get_keyframes(path, "pelvis")
+
+    assert list(keyframes.valueY) == [1.0, 4.0]
+    assert cache.get_keyframes(path, "pelvis") is keyframes
+    assert len(cache.get_keyframes(path, "other")) == 1
+    assert (cache.parsed_count, cache.streamed_count) == (1, 0)
+
+
+def test_single_file_is_parsed_again_when_modified(tmp_path):
+    path = str(tmp_path / "scene.xml")
+    write_scene(path)
+    cache = SingleFileCache([path, path])
+    keyframes = cache.get_keyframes(path, "pelvis")
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert cache.get_keyframes(path, "pelvis") is not keyframes
+    assert cache.parsed_count == 2
+
+
+def test_single_use_file_is_streamed(tmp_path):
+    path = str(tmp_path / "scene.xml")
+    write_scene(path)
+    cache = SingleFileCache([path])
+
+    assert list(cache.get_keyframes(path, "pelvis").time) == [0, 100000]
+    assert (cache.parsed_count, cache.streamed_count) == (0, 1)
@@ -0,0 +1,60 @@
+from xml.etree import ElementTree as et
+
+from kk_plap_generator import settings
+from kk_plap_generator.generator.utils import (
+    END_TICKS,
+    convert_KKtime_to_ticks,
+    format_number,
+    format_ticks,
+    load_template,
+    make_keyframe,
+)
+
+
+def test_load_template_is_cached():
+    root = load_template(settings.TEMPLATE_FILE)
+    assert load_template(settings.TEMPLATE_FILE) is root
+    assert root.find("interpolable[@alias='Preg+']") is not None
+
+
+def test_make_keyframe_shares_curve_keyframes():
+    template = et.Element("keyframe", time="0", value="0", alias="LinearCurve")
+    template.extend(
+        [
+            et.Element(
+                "curveKeyframe", time="0", value="0", inTangent="0", outTangent="1"
+            ),
+            et.Element(
+                "curveKeyframe", time="1", value="1", inTangent="1", outTangent="0"
+            ),
+        ]
+    )
+
+    keyframe = make_keyframe(template, 1.5, 30)
+
+    assert keyframe.attrib == {"time": "1.5", "value": "30", "alias": "LinearCurve"}
+    assert template.attrib == {"time": "0", "value": "0", "alias": "LinearCurve"}
+    assert all(a is b for a, b in zip(keyframe, template))
+    assert len(keyframe) == len(template) == 2
+
+
+def test_format_number():
+    assert format_number(12.350000000000001) == "12.35"
+    assert format_number(0.17642000000000002) == "0.17642"
+    assert format_number(3.0) == "3"
+    assert format_number(-0.000001) == "0"
+    assert format_number(1e-05) == "0.00001"
+
+
+def test_format_ticks():
+    assert format_ticks(927755) == "9.27755"
+    assert format_ticks(1230000) == "12.3"
+    assert format_ticks(500000) == "5"
+    assert format_ticks(-1) == "-0.00001"
+    assert format_ticks(0) == "0"
+
+
+def test_convert_KKtime_to_ticks():
+    assert convert_KKtime_to_ticks("01:02.35") == 6235000
+    assert convert_KKtime_to_ticks("00:00.1") == 10000
+    assert convert_KKtime_to_ticks("END") == END_TICKS
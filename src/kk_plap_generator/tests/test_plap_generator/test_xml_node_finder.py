@@ -0,0 +1,78 @@
+import io
+from xml.etree import ElementTree as et
+
+import pytest
+
+from kk_plap_generator.generator import xml_node_finder
+from kk_plap_generator.generator.xml_node_finder import (
+    NODE_NOT_FOUND,
+    InterpolableIndex,
+    NodeNotFoundError,
+    deep_find_interpolable,
+    deep_find_possible_matches,
+    iterparse_interpolable,
+)
+
+SCENE = b"""<root>
+  <interpolableGroup name="a">
+    <interpolable alias="left"><keyframe time="0" /></interpolable>
+    <interpolable alias="right"><keyframe time="1" /></interpolable>
+  </interpolableGroup>
+  <interpolable alias="pelvis"><keyframe time="2" /><keyframe time="3" /></interpolable>
+</root>"""
+
+
+def test_iterparse_interpolable_finds_alias():
+    node = iterparse_interpolable(io.BytesIO(SCENE), "pelvis")
+
+    assert node.get("alias") == "pelvis"
+    assert [kf.get("time") for kf in node] == ["2", "3"]
+
+
+def test_iterparse_interpolable_closes_path(tmp_path, monkeypatch):
+    path = tmp_path / "scene.xml"
+    path.write_bytes(SCENE)
+    opened = []
+
+    def tracking_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(xml_node_finder, "open", tracking_open, raising=False)
+    node = iterparse_interpolable(str(path), "left")
+
+    assert node.get("alias") == "left"
+    assert len(opened) == 1 and opened[0].closed
+
+
+def test_iterparse_interpolable_reports_suggestions():
+    with pytest.raises(NodeNotFoundError) as exc_info:
+        iterparse_interpolable(io.BytesIO(SCENE), "missing")
+
+    assert exc_info.value.suggestions == ["left", "right", "pelvis"]
+
+
+def test_iterparse_interpolable_single_chain_fallback():
+    scene = b"""<root><group><interpolable alias="only"><keyframe time="0" />
+    <keyframe time="1" /></interpolable></group></root>"""
+
+    node = iterparse_interpolable(io.BytesIO(scene), "")
+
+    assert node.get("alias") == "only"
+    assert len(node) == 2
+
+
+def test_interpolable_index_matches_deep_find():
+    root = et.fromstring(SCENE)
+    index = InterpolableIndex(root)
+
+    assert index.aliases == deep_find_possible_matches(list(root), "alias")
+    for alias in index.aliases:
+        assert index.find(alias) is deep_find_interpolable(list(root), alias)
+    assert index.find_path("a.right") is index.find("right")
+    assert index.find_path("pelvis") is index.find("pelvis")
+    assert index.single is NODE_NOT_FOUND
+
+    with pytest.raises(NodeNotFoundError) as exc_info:
+        index.find("missing")
+    assert exc_info.value.suggestions == ["left", "right", "pelvis"]
@@ -0,0 +1,93 @@
+import os
+from xml.etree import ElementTree as et
+
+from kk_plap_generator.generator.models import InterpolableTable
+from kk_plap_generator.generator.utils import copy_node, format_ticks, make_keyframe
+from kk_plap_generator.generator.xml_writer import (
+    serialize_interpolables,
+    write_interpolables,
+    write_outputs,
+)
+
+
+def make_interpolable():
+    template = et.Element("keyframe", time="0", value="0", alias="LinearCurve")
+    template.append(
+        et.Element("curveKeyframe", time="0", value="0", inTangent="0", outTangent="1")
+    )
+    interpolable = et.Element("interpolable", alias='Quote " & <Solo>', id="x\ty")
+    interpolable.extend(
+        make_keyframe(template, time, value)
+        for time, value in ((0.0, "false"), (12.350000000000001, "true"), (-0.04, 45))
+    )
+    interpolable.append(et.Element("keyframe", time="1"))
+    return interpolable
+
+
+def test_serialize_interpolables_matches_element_tree():
+    interpolable = make_interpolable()
+    root = et.Element("root")
+    root.append(interpolable)
+
+    expected = et.tostring(root, encoding="unicode")
+
+    assert serialize_interpolables([interpolable]) == expected
+    assert 'time="12.35"' in expected
+
+
+def test_serialize_interpolable_table_matches_keyframes():
+    curve = et.Element("keyframe", time="0", value="0", alias="{Linear}")
+    curve.append(
+        et.Element("curveKeyframe", time="0", value="0", inTangent="0", outTangent="1")
+    )
+    templates = [curve, et.Element("keyframe", alias="Same"), et.Element("keyframe")]
+    node = et.Element("interpolable", alias="Preg+")
+    rows = [(0, 0, 0), (1235000, "a & b", 1), (1240000, 45.5, 2), (1300001, 10, 0)]
+
+    table = InterpolableTable(node, templates)
+    interpolable = copy_node(node)
+    for time, value, template in rows:
+        table.append(time, value, template)
+        interpolable.append(make_keyframe(templates[template], format_ticks(time), value))
+
+    assert serialize_interpolables([table]) == serialize_interpolables([interpolable])
+    assert serialize_interpolables([InterpolableTable(node)]) == (
+        '<root><interpolable alias="Preg+" /></root>'
+    )
+
+
+def test_write_interpolables(tmp_path):
+    path = str(tmp_path / "Solo.xml")
+    assert write_interpolables(path, [make_interpolable()])
+
+    root = et.parse(path).getroot()
+    assert [kf.get("time") for kf in root[0]] == ["0", "12.35", "-0.04", "1"]
+
+
+def test_write_outputs_skips_unchanged_files(tmp_path):
+    paths = [str(tmp_path / f"{name}.xml") for name in ("Solo", "Preg+")]
+    outputs = {path: [make_interpolable()] for path in paths}
+    assert write_outputs(outputs) == {paths[0]: True, paths[1]: True}
+    mtime = os.stat(paths[0]).st_mtime_ns
+
+    outputs[paths[1]][0].set("alias", "Preg+")
+
+    assert write_outputs(outputs) == {paths[0]: False, paths[1]: True}
+    assert os.stat(paths[0]).st_mtime_ns == mtime
+    assert et.parse(paths[1]).getroot()[0].get("alias") == "Preg+"
+    assert sorted(os.listdir(tmp_path)) == ["Preg+.xml", "Solo.xml"]
+
+
+def test_write_interpolables_keeps_mode(tmp_path):
+    path = str(tmp_path / "Solo.xml")
+    umask = os.umask(0)
+    os.umask(umask)
+    assert write_interpolables(path, [make_interpolable()])
+    assert os.stat(path).st_mode & 0o777 == 0o666 & ~umask
+
+    os.chmod(path, 0o640)
+    interpolable = make_interpolable()
+    interpolable.set("alias", "Preg+")
+    assert write_interpolables(path, [interpolable])
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    assert sorted(os.listdir(tmp_path)) == ["Solo.xml"]